@@ -0,0 +1,179 @@
+"""
+Token alignment between a model input and a model output
+which do not have the same number of tokens.
+
+The tokens are aligned with a weighted edit distance, where substituting
+one token with another costs less the more similar the two tokens are.
+Input tokens next to an insertion or deletion are considered misaligned
+(unless they are identical to their output token), all other input tokens
+keep the output token they are aligned with.
+
+Since the model output differs from its input by a few merged or split
+tokens, the table of the edit distance is restricted to a band around the
+diagonal, and identical tokens at the start and the end are not part of it.
+"""
+
+from difflib import SequenceMatcher
+
+# Number of diagonals on either side of the band of the edit distance table
+# beyond the difference in length of the two sequences.
+BAND_MARGIN = 5
+
+INFINITY = float('inf')
+
+
+def _align_band(source, target, margin):
+    """
+    Align two token sequences with a weighted edit distance, restricted to
+    a diagonal band of the table around the difference in length.
+
+    Args:
+        source (list): the input tokens.
+        target (list): the output tokens.
+        margin (int): the number of extra diagonals on either side.
+
+    Returns:
+        list: the edit operations as (op, i, j) tuples.
+    """
+
+    rows = len(source) + 1
+    cols = len(target) + 1
+    # the allowed values of j - i
+    low = min(0, cols - rows) - margin
+    high = max(0, cols - rows) + margin
+
+    ratios = {}
+
+    def substitution(i, j):
+        # the cost of aligning source[i-1] with target[j-1], memoized by
+        # token pair for the table and the backtracking
+        if source[i-1] == target[j-1]:
+            return 0.0
+        pair = (source[i-1], target[j-1])
+        value = ratios.get(pair)
+        if value is None:
+            value = ratios[pair] = 1 - SequenceMatcher(None, *pair).ratio()
+        return value
+
+    starts = []
+    cost = []
+
+    def at(i, j):
+        if i < 0:
+            return INFINITY
+        k = j - starts[i]
+        if 0 <= k < len(cost[i]):
+            return cost[i][k]
+        return INFINITY
+
+    for i in range(rows):
+        first = max(0, i + low)
+        last = min(cols - 1, i + high)
+        row = []
+        for j in range(first, last + 1):
+            if i == 0:
+                value = float(j)
+            elif j == 0:
+                value = float(i)
+            else:
+                value = min(at(i-1, j-1) + substitution(i, j),
+                            at(i-1, j) + 1,
+                            row[-1] + 1 if row else INFINITY)
+            row.append(value)
+        starts.append(first)
+        cost.append(row)
+
+    operations = []
+    i = rows - 1
+    j = cols - 1
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            if at(i, j) == at(i-1, j-1) + substitution(i, j):
+                operations.append(('sub', i-1, j-1))
+                i -= 1
+                j -= 1
+                continue
+        if i > 0 and at(i, j) == at(i-1, j) + 1:
+            operations.append(('del', i-1, None))
+            i -= 1
+        else:
+            operations.append(('ins', None, j-1))
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+def align_tokens(source, target, margin=BAND_MARGIN):
+    """
+    Align two token sequences with a weighted edit distance.
+    The identical tokens at the start and the end are aligned directly,
+    the rest with a table restricted to a diagonal band.
+
+    Args:
+        source (list): the input tokens.
+        target (list): the output tokens.
+        margin (int): the number of diagonals of the band on either side
+            beyond the difference in length.
+
+    Returns:
+        list: the edit operations as (op, i, j) tuples, where op is 'sub'
+            (source[i] aligned with target[j]), 'del' (source[i] has no
+            counterpart, j is None) or 'ins' (target[j] has no counterpart,
+            i is None).
+    """
+
+    length = min(len(source), len(target))
+    prefix = 0
+    while prefix < length and source[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < length - prefix \
+            and source[-1-suffix] == target[-1-suffix]:
+        suffix += 1
+
+    source_end = len(source) - suffix
+    target_end = len(target) - suffix
+    operations = [('sub', k, k) for k in range(prefix)]
+    for op, i, j in _align_band(source[prefix:source_end],
+                                target[prefix:target_end], margin):
+        operations.append((op, None if i is None else i + prefix,
+                           None if j is None else j + prefix))
+    operations.extend(('sub', source_end + k, target_end + k)
+                      for k in range(suffix))
+    return operations
+
+
+def partial_alignment(source, target):
+    """
+    Map each input token to its output token, except for the
+    misaligned tokens around insertions and deletions.
+
+    Args:
+        source (list): the input tokens.
+        target (list): the output tokens.
+
+    Returns:
+        tuple: a list with the aligned output token of each input token
+            (None if misaligned) and the sorted positions of the
+            misaligned input tokens.
+    """
+
+    operations = align_tokens(source, target)
+    aligned = [None] * len(source)
+    misaligned = set()
+    for index, (op, i, j) in enumerate(operations):
+        if op == 'sub':
+            aligned[i] = target[j]
+            continue
+        if op == 'del':
+            misaligned.add(i)
+        # the neighbours of an insertion or deletion may be merged or split,
+        # unless they are identical to their output token
+        for neighbour in (index-1, index+1):
+            if 0 <= neighbour < len(operations):
+                neighbour_op, i, j = operations[neighbour]
+                if neighbour_op == 'sub' and source[i] != target[j]:
+                    misaligned.add(i)
+    for i in misaligned:
+        aligned[i] = None
+    return aligned, sorted(misaligned)
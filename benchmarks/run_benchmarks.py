@@ -0,0 +1,222 @@
+"""
+Benchmark the normalizer on the test set and on synthetic inputs.
+
+Every benchmark runs in a fresh process, so that the peak RSS and the model
+loading time belong to that run alone. The synthetic inputs are scaled up
+from the words of the test set with different line lengths (in words) and
+tag densities (share of words followed by a <sup>...</sup> tag).
+
+For each run, the results contain:
+- the throughput in sentences and words per second
+- the p50/p95/p99 latency per line (or per window of lines in batch mode)
+- the peak RSS and the model loading time
+- the fallback rate (share of lines normalized with the fallback model)
+  and the number of fallback windows decoded per line
+- the time spent in each stage of the normalizer (see
+  Normalizer.instrumentation) and its event counters
+
+The results are written as JSON, together with the current commit,
+so that runs of different commits can be compared.
+
+Usage: python -m benchmarks.run_benchmarks -c config_normalizer.json
+           [-b 64] [--lengths 8 32 128] [--tag-densities 0 0.2] [-o results.json]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import random
+import re
+import resource
+import subprocess
+import time
+
+from instrumentation import percentile
+from normalize import (NESTED_TIMERS, Normalizer, configure_logging,
+                       read_windows)
+
+TAG = re.compile(r'<[^<>]*>[^<>]*</[^<>]*>')
+PUNCTUATION = [',', ',', ',', '.', ';', ':']
+
+
+def synthetic_lines(words, num_lines, length, tag_density, seed=1):
+    """
+    Generate lines from random words of a vocabulary.
+
+    Args:
+        words (list): the vocabulary.
+        num_lines (int): the number of lines.
+        length (int): the number of words per line.
+        tag_density (float): the probability that a word is followed by a tag.
+        seed (int): the random seed.
+
+    Returns:
+        list: the lines.
+    """
+
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(num_lines):
+        tokens = []
+        for position in range(length):
+            word = rng.choice(words)
+            if rng.random() < tag_density:
+                word += f'<sup>f{rng.randint(1, 99)}</sup>'
+            if position < length-1 and rng.random() < 0.1:
+                word += rng.choice(PUNCTUATION)
+            tokens.append(word)
+        lines.append(' '.join(tokens) + '.')
+    return lines
+
+
+def run_benchmark(config, lines, batch_size, max_tokens, window_size):
+    """
+    Normalize lines and measure the throughput, latency and stages.
+    Runs in a separate process.
+
+    Returns:
+        dict: the measurements.
+    """
+
+    configure_logging('WARNING')
+    start = time.perf_counter()
+    normalizer = Normalizer(dict(config, instrumentation=True))
+    normalizer.warmup()
+    load_seconds = time.perf_counter() - start
+
+    normalizer.stats(reset=True)
+    latencies = []
+    start = time.perf_counter()
+    if batch_size is None and max_tokens is None:
+        for line in lines:
+            line_start = time.perf_counter()
+            normalizer.normalize(line)
+            latencies.append(time.perf_counter() - line_start)
+    else:
+        for window in read_windows(lines, window_size):
+            window_start = time.perf_counter()
+            normalizer.normalize_batch(window, max_tokens=max_tokens,
+                                       max_sentences=batch_size)
+            latencies.append(time.perf_counter() - window_start)
+    seconds = time.perf_counter() - start
+
+    num_words = sum(len(line.split()) for line in lines)
+    stats = normalizer.stats()
+    counters = stats['counters']
+    stages = {name: round(timer['seconds'], 3)
+              for name, timer in stats['timers'].items()
+              if name not in NESTED_TIMERS}
+    to_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'sentences': len(lines),
+        'words': num_words,
+        'seconds': round(seconds, 3),
+        'sentences_per_second': round(len(lines) / seconds, 2),
+        'words_per_second': round(num_words / seconds, 2),
+        'latency_unit': 'line' if batch_size is None and max_tokens is None
+                        else 'window',
+        'latency_p50_ms': to_ms(percentile(latencies, 0.5)),
+        'latency_p95_ms': to_ms(percentile(latencies, 0.95)),
+        'latency_p99_ms': to_ms(percentile(latencies, 0.99)),
+        # kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'load_seconds': round(load_seconds, 3),
+        'model_timings': {name: round(value, 3)
+                          for name, value in normalizer.timings.items()},
+        'fallback_rate': round(
+            counters.get('fallback_sentences', 0) / len(lines), 4),
+        'fallback_windows_per_line': round(
+            counters.get('fallback_windows', 0) / len(lines), 4),
+        'stage_seconds': dict(stages, other=round(seconds - sum(
+            stages.values()), 3)),
+        'counters': counters,
+    }
+
+
+def current_commit():
+    """
+    Get the hash of the current git commit, or None outside a repository.
+    """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Run the benchmarks and write the results to a JSON file.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the normalizer.')
+    parser.add_argument('--config', '-c', type=str, required=True,
+                        help='JSON file indicating the parameters for the '\
+                        'main model and the fallback model.')
+    parser.add_argument('--source', '-s', type=str, default='data/test.fnhd',
+                        help='Test set (default: data/test.fnhd).')
+    parser.add_argument('--batch-size', '-b', type=int, default=None,
+                        help='Maximum number of sentences per batch '\
+                        '(default: normalize line by line).')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help='Maximum number of subword tokens per batch.')
+    parser.add_argument('--window-size', type=int, default=1000,
+                        help='Number of lines normalized together '\
+                        '(default: 1000).')
+    parser.add_argument('--lengths', type=int, nargs='*', default=[8, 32, 128],
+                        help='Words per line of the synthetic inputs '\
+                        '(default: 8 32 128).')
+    parser.add_argument('--tag-densities', type=float, nargs='*',
+                        default=[0.0, 0.2],
+                        help='Tag densities of the synthetic inputs '\
+                        '(default: 0 0.2).')
+    parser.add_argument('--synthetic-words', type=int, default=20000,
+                        help='Number of words of each synthetic input '\
+                        '(default: 20000).')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed of the synthetic inputs.')
+    parser.add_argument('--output', '-o', type=str,
+                        default='benchmark_results.json',
+                        help='JSON file for the results '\
+                        '(default: benchmark_results.json).')
+    args = parser.parse_args()
+    configure_logging('INFO')
+
+    with open(args.config) as jsonfile:
+        config = json.load(jsonfile)
+    with open(args.source) as infile:
+        test_lines = [line.strip() for line in infile]
+    words = sorted({word for line in test_lines
+                    for word in TAG.sub('', line).split()})
+
+    benchmarks = [({'input': args.source}, test_lines)]
+    for length in args.lengths:
+        for tag_density in args.tag_densities:
+            lines = synthetic_lines(words, max(1, args.synthetic_words//length),
+                                    length, tag_density, args.seed)
+            benchmarks.append(({'input': 'synthetic', 'length': length,
+                                'tag_density': tag_density}, lines))
+
+    results = []
+    for description, lines in benchmarks:
+        # a fresh process per run for the peak RSS and the loading time
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_benchmark, config, lines,
+                                     args.batch_size, args.max_tokens,
+                                     args.window_size).result()
+        results.append(dict(description, **result))
+        print(json.dumps(results[-1]))
+
+    with open(args.output, 'w') as outfile:
+        json.dump({'commit': current_commit(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'config': args.config,
+                   'batch_size': args.batch_size,
+                   'max_tokens': args.max_tokens,
+                   'results': results}, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
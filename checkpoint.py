@@ -0,0 +1,139 @@
+"""
+Checkpoints for resumable normalization runs.
+
+The progress of a run is recorded in a sidecar manifest next to the output
+file (OUTFILE.progress.json). It holds the byte offsets of the input and the
+output after the last committed line, the number of committed lines and
+a SHA-256 hash of the input up to the committed offset. A resumed run checks
+the hash, truncates the output to the committed offset and continues with
+the next input line.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger('normalize')
+
+
+class Checkpoint():
+    """
+    Manifest of a resumable run.
+
+    Args:
+        source (str): the input file.
+        outfile (str): the output file.
+        interval (int): minimum number of lines between two commits.
+
+    Attributes:
+        path (str): the manifest file.
+        input_offset (int): byte offset in the input after the last
+            committed line.
+        output_offset (int): byte offset in the output after the last
+            committed line.
+        lines (int): the number of committed lines.
+        complete (bool): whether the whole input has been normalized.
+    """
+
+    def __init__(self, source, outfile, interval=1000):
+        self.source = source
+        self.outfile = outfile
+        self.interval = interval
+        self.path = f'{outfile}.progress.json'
+        self.input_offset = 0
+        self.output_offset = 0
+        self.lines = 0
+        self.complete = False
+        self.digest = hashlib.sha256()
+
+    def _hash_input(self, end):
+        """
+        Add the input bytes from the committed offset up to end to the hash.
+        """
+
+        with open(self.source, 'rb') as infile:
+            infile.seek(self.input_offset)
+            remaining = end - self.input_offset
+            while remaining > 0:
+                block = infile.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                self.digest.update(block)
+                remaining -= len(block)
+
+    def resume(self):
+        """
+        Load the manifest, if there is one, verify it against the input
+        and truncate the output to the last committed line.
+        Without a manifest, the run starts from the beginning.
+
+        Raises:
+            ValueError: if the manifest does not match the input or output.
+        """
+
+        if not os.path.exists(self.path):
+            logger.info('No progress manifest %s found, starting from the '
+                        'beginning.', self.path)
+            open(self.outfile, 'w').close()
+            return
+        with open(self.path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['input_offset'] > os.path.getsize(self.source):
+            raise ValueError(f'The input {self.source} is shorter than '
+                             f'recorded in {self.path}.')
+        self._hash_input(manifest['input_offset'])
+        if self.digest.hexdigest() != manifest['input_sha256']:
+            raise ValueError(f'The input {self.source} does not match the '
+                             f'input recorded in {self.path}.')
+        if not os.path.exists(self.outfile) \
+                or os.path.getsize(self.outfile) < manifest['output_offset']:
+            raise ValueError(f'The output {self.outfile} is shorter than '
+                             f'recorded in {self.path}.')
+        with open(self.outfile, 'r+b') as outfile:
+            outfile.truncate(manifest['output_offset'])
+        self.input_offset = manifest['input_offset']
+        self.output_offset = manifest['output_offset']
+        self.lines = manifest['lines']
+        self.complete = manifest.get('complete', False)
+        logger.info('Resuming after %d committed lines.', self.lines)
+
+    def commit(self, input_offset, outfile, lines, complete=False):
+        """
+        Make the written output durable and record the progress.
+
+        Args:
+            input_offset (int): byte offset in the input after the last
+                line that has been written.
+            outfile: the open output file.
+            lines (int): the total number of written lines.
+            complete (bool): whether the whole input has been normalized.
+        """
+
+        outfile.flush()
+        os.fsync(outfile.fileno())
+        self._hash_input(input_offset)
+        self.input_offset = input_offset
+        self.output_offset = os.path.getsize(self.outfile)
+        self.lines = lines
+        self.complete = complete
+        manifest = {'source': os.path.abspath(self.source),
+                    'input_offset': self.input_offset,
+                    'output_offset': self.output_offset,
+                    'lines': self.lines,
+                    'input_sha256': self.digest.hexdigest(),
+                    'complete': self.complete}
+        with open(f'{self.path}.tmp', 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def update(self, input_offset, outfile, lines):
+        """
+        Commit the progress if at least self.interval lines have been
+        written since the last commit.
+        """
+
+        if lines - self.lines >= self.interval:
+            self.commit(input_offset, outfile, lines)
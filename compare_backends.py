@@ -0,0 +1,138 @@
+"""
+Compare the accuracy and throughput of the inference backends on a corpus.
+
+Every backend normalizes the whole corpus with the same batching settings.
+The outputs of the first backend (or of a reference file, if given) serve as
+the gold standard: the report shows the share of identical sentences and of
+identical words, the loading time and the throughput of every backend.
+
+Usage: python compare_backends.py -c config_normalizer.json -s data/test.fnhd
+           [--backends fp32 int8] [--reference test.nhd]
+"""
+
+import argparse
+from difflib import SequenceMatcher
+import json
+import time
+
+from model_export import BACKENDS
+from normalize import Normalizer, configure_logging, logger, read_windows
+
+
+def word_accuracy(hypothesis, reference):
+    """
+    Count the words of a reference sentence that a hypothesis reproduces.
+
+    Args:
+        hypothesis (str): the normalized sentence.
+        reference (str): the reference sentence.
+
+    Returns:
+        int: the number of matching words in the token alignment.
+    """
+
+    matcher = SequenceMatcher(None, hypothesis.split(), reference.split(),
+                              autojunk=False)
+    return sum(block.size for block in matcher.get_matching_blocks())
+
+
+def run_backend(config, backend, lines, args):
+    """
+    Normalize the lines with one backend.
+
+    Returns:
+        tuple: the normalized lines and a dict with the loading time and the
+            throughput in sentences and words per second.
+    """
+
+    start = time.perf_counter()
+    normalizer = Normalizer(dict(config, backend=backend))
+    normalizer.warmup()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    outputs = []
+    for window in read_windows(lines, args.window_size):
+        outputs.extend(normalizer.normalize_batch(
+            window, max_tokens=args.max_tokens, max_sentences=args.batch_size))
+    elapsed = time.perf_counter() - start
+    num_words = sum(len(line.split()) for line in lines)
+    return outputs, {'backend': backend,
+                     'load_seconds': round(load_time, 3),
+                     'seconds': round(elapsed, 3),
+                     'sentences_per_second': round(len(lines) / elapsed, 2),
+                     'words_per_second': round(num_words / elapsed, 2)}
+
+
+def main():
+    """
+    Run every backend on the corpus and report accuracy and throughput.
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the accuracy and '\
+                                     'throughput of the inference backends.')
+    parser.add_argument('--config', '-c', type=str, required=True,
+                        help='JSON file indicating the parameters for the '\
+                        'main model and the fallback model.')
+    parser.add_argument('--source', '-s', type=str, default='data/test.fnhd',
+                        help='Corpus to normalize (default: data/test.fnhd).')
+    parser.add_argument('--reference', '-r', type=str, default=None,
+                        help='Gold normalization of the corpus (default: '\
+                        'the output of the first backend).')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS,
+                        default=list(BACKENDS),
+                        help='Backends to compare (default: fp32 int8).')
+    parser.add_argument('--batch-size', '-b', type=int, default=64,
+                        help='Maximum number of sentences per batch '\
+                        '(default: 64).')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help='Maximum number of subword tokens per batch.')
+    parser.add_argument('--window-size', type=int, default=1000,
+                        help='Number of lines normalized together '\
+                        '(default: 1000).')
+    parser.add_argument('--json', type=str, default=None,
+                        help='Also write the results to this JSON file.')
+    args = parser.parse_args()
+    configure_logging('INFO')
+
+    with open(args.config) as jsonfile:
+        config = json.load(jsonfile)
+    with open(args.source) as infile:
+        lines = [line.strip() for line in infile]
+    references = None
+    if args.reference is not None:
+        with open(args.reference) as infile:
+            references = [line.strip() for line in infile]
+
+    results = []
+    for backend in args.backends:
+        outputs, result = run_backend(config, backend, lines, args)
+        if references is None:
+            references = outputs
+        num_words = sum(len(reference.split()) for reference in references)
+        result['sentence_accuracy'] = round(sum(
+            output == reference for output, reference
+            in zip(outputs, references)) / len(references), 4)
+        result['word_accuracy'] = round(sum(
+            word_accuracy(output, reference) for output, reference
+            in zip(outputs, references)) / num_words, 4)
+        results.append(result)
+        logger.info('Normalized %d sentences with %s in %.1f s.', len(lines),
+                    backend, result['seconds'])
+
+    baseline = results[0]['sentences_per_second']
+    print('backend\tload_s\tsent/s\twords/s\tspeedup\tsent_acc\tword_acc')
+    for result in results:
+        print(f"{result['backend']}\t{result['load_seconds']:.1f}\t"
+              f"{result['sentences_per_second']:.1f}\t"
+              f"{result['words_per_second']:.1f}\t"
+              f"{result['sentences_per_second'] / baseline:.2f}\t"
+              f"{result['sentence_accuracy']:.4f}\t"
+              f"{result['word_accuracy']:.4f}")
+    if args.json is not None:
+        with open(args.json, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Optional instrumentation of the normalizer.
+
+Instrumentation records the time spent in each stage of the normalizer and
+counts events such as fallback invocations. When it is disabled, timers and
+counters return immediately, so the hot paths can be instrumented at
+a negligible cost.
+
+The percentile function summarizes latencies, e.g. for the /metrics endpoint
+of the server and for the benchmarks.
+
+SamplingProfiler samples the stack of a thread in regular intervals and
+writes the samples as collapsed stacks (one "frame;frame;... count" line per
+stack), which flamegraph.pl, speedscope and similar tools can render.
+"""
+
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+
+class _Timer():
+    """
+    Context manager that adds its duration to a timer of an Instrumentation.
+    """
+
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.seconds[self.name] += \
+            time.perf_counter() - self.start
+        self.instrumentation.calls[self.name] += 1
+
+
+class _NullTimer():
+    """
+    Context manager that does nothing, used while instrumentation is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def percentile(values, fraction):
+    """
+    Compute a percentile of a list of numbers (nearest rank).
+
+    Args:
+        values (list): the numbers.
+        fraction (float): the percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: the percentile, or None if there are no values.
+    """
+
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values)-1, int(fraction * len(values)))]
+
+
+class Instrumentation():
+    """
+    Per-stage timers and event counters.
+
+    Args:
+        enabled (bool): record timers and counters.
+
+    Attributes:
+        seconds (Counter): the total duration of each timer.
+        calls (Counter): the number of measurements of each timer.
+        counters (Counter): the event counters.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+
+    def timer(self, name):
+        """
+        Measure the duration of a with block.
+
+        Args:
+            name (str): the name of the timer.
+
+        Returns:
+            a context manager.
+        """
+
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def count(self, name, value=1):
+        """
+        Increase an event counter.
+
+        Args:
+            name (str): the name of the counter.
+            value (int): the increment.
+        """
+
+        if self.enabled:
+            self.counters[name] += value
+
+    def stats(self, reset=False):
+        """
+        Get the timers and counters.
+
+        Args:
+            reset (bool): reset the timers and counters afterwards.
+
+        Returns:
+            dict: the seconds and calls of each timer and the counters,
+                empty if instrumentation is disabled.
+        """
+
+        if not self.enabled:
+            return {}
+        stats = {'timers': {name: {'seconds': self.seconds[name],
+                                   'calls': self.calls[name]}
+                            for name in self.seconds},
+                 'counters': dict(self.counters)}
+        if reset:
+            self.seconds.clear()
+            self.calls.clear()
+            self.counters.clear()
+        return stats
+
+
+class SamplingProfiler():
+    """
+    Sample the stack of a thread from a background thread.
+
+    Args:
+        path (str): the file to which the collapsed stacks are written.
+        interval (float): the time between two samples in seconds.
+        thread_id (int): the thread to sample (default: the thread
+            that creates the profiler).
+
+    Attributes:
+        samples (Counter): the number of samples of each collapsed stack.
+    """
+
+    def __init__(self, path, interval=0.005, thread_id=None):
+        self.path = path
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        """
+        Record a sample in every interval until stopped.
+        """
+
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({os.path.basename(code.co_filename)}:'
+                             f'{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        """
+        Start sampling.
+        """
+
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and write the collapsed stacks.
+
+        Returns:
+            int: the number of samples.
+        """
+
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, 'w') as outfile:
+            for stack, count in self.samples.most_common():
+                outfile.write(f'{stack} {count}\n')
+        return sum(self.samples.values())
@@ -0,0 +1,114 @@
+"""
+Lexicon of deterministic word normalizations.
+
+If every token of a sentence is confidently covered by the lexicon,
+the normalizer can skip the Transformer models for that sentence.
+
+The lexicon is a tab-separated file with one entry per line:
+- "source": the word is left unchanged
+- "source<TAB>target": the word is always normalized as target
+- "source<TAB>target<TAB>count<TAB>confidence": a mined entry; target is the
+    most frequent normalization of source (seen count times), and confidence
+    is its share among all normalizations of source
+
+Mined entries are written by LexiconMiner, which collects the word pairs of
+all sentences that the main model normalized with a one-to-one alignment.
+"""
+
+from collections import Counter, defaultdict
+import re
+
+# Punctuation and numbers are never changed by the models.
+INVARIANT_TOKEN = re.compile(r'[\d.,;:!?()„“’/–−-]+$')
+
+
+class Lexicon():
+    """
+    Table of words with a confident normalization.
+
+    Args:
+        path (str): the lexicon file.
+        threshold (float): minimum confidence of a mined entry.
+        min_count (int): minimum count of a mined entry.
+
+    Attributes:
+        table (dict): the confident normalization of each word.
+        stats (dict): counters of covered sentences and tokens.
+    """
+
+    def __init__(self, path, threshold=0.99, min_count=5):
+        self.table = {}
+        with open(path) as infile:
+            for line in infile:
+                fields = line.rstrip('\n').split('\t')
+                if not fields[0]:
+                    continue
+                if len(fields) == 1:
+                    self.table[fields[0]] = fields[0]
+                elif len(fields) == 2:
+                    self.table[fields[0]] = fields[1]
+                elif int(fields[2]) >= min_count \
+                        and float(fields[3]) >= threshold:
+                    self.table[fields[0]] = fields[1]
+        self.stats = {'sentences': 0, 'sentences_covered': 0,
+                      'tokens': 0, 'tokens_covered': 0}
+
+    def normalize(self, model_input):
+        """
+        Normalize a preprocessed string with the lexicon.
+
+        Args:
+            model_input (str): the preprocessed string.
+
+        Returns:
+            str: the normalized string if all tokens are covered,
+                otherwise None.
+        """
+
+        tokens = model_input.split()
+        output = []
+        for token in tokens:
+            target = self.table.get(token)
+            if target is None and INVARIANT_TOKEN.match(token):
+                target = token
+            if target is not None:
+                output.append(target)
+        self.stats['sentences'] += 1
+        self.stats['tokens'] += len(tokens)
+        self.stats['tokens_covered'] += len(output)
+        if len(output) < len(tokens):
+            return None
+        self.stats['sentences_covered'] += 1
+        return ' '.join(output)
+
+
+class LexiconMiner():
+    """
+    Collect word normalizations from aligned sentence pairs.
+
+    Attributes:
+        counts (dict): the counts of the normalizations of each word.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(Counter)
+
+    def add(self, model_input, model_output):
+        """
+        Add the word pairs of a sentence and its one-to-one normalization.
+        """
+
+        for source, target in zip(model_input.split(), model_output.split()):
+            self.counts[source][target] += 1
+
+    def write(self, path):
+        """
+        Write the most frequent normalization of each word with its count
+        and confidence to a lexicon file.
+        """
+
+        with open(path, 'w') as outfile:
+            for source in sorted(self.counts):
+                target, count = self.counts[source].most_common(1)[0]
+                confidence = count / sum(self.counts[source].values())
+                outfile.write(f'{source}\t{target}\t{count}\t{confidence:.4f}\n')
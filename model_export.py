@@ -0,0 +1,185 @@
+"""
+Export the normalizer models for faster CPU inference.
+
+For every model in the configuration, the export writes a copy whose linear
+layers are dynamically quantized to int8 (weights stored as int8, activations
+quantized on the fly). The normalizer loads these copies instead of the fp32
+checkpoints if the configuration contains "backend": "int8".
+With --torchscript, a TorchScript version of the beam search generator
+is written as well, for deployment without the fairseq Python code.
+
+Usage: python normalize.py export -c config_normalizer.json [--torchscript]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger('normalize')
+
+BACKENDS = ('fp32', 'int8')
+
+
+def checkpoint_path(model_config, backend='fp32'):
+    """
+    Get the checkpoint file of a model for a backend.
+
+    Args:
+        model_config (dict): the configuration of the model.
+        backend (str): 'fp32' or 'int8'.
+
+    Returns:
+        str: the path of the checkpoint file, e.g. models/main/model.int8.pt
+            for the int8 backend (unless "quantized_checkpoint_file" is set).
+    """
+
+    checkpoint_file = model_config['checkpoint_file']
+    if backend == 'int8':
+        checkpoint_file = model_config.get(
+            'quantized_checkpoint_file',
+            os.path.splitext(checkpoint_file)[0] + '.int8.pt')
+    elif backend != 'fp32':
+        raise ValueError(f'Unknown backend {backend}, '
+                         f'expected one of {", ".join(BACKENDS)}.')
+    return os.path.join(model_config['path'], checkpoint_file)
+
+
+def load_model(model_config, backend='fp32'):
+    """
+    Load a model as a fairseq hub model.
+
+    Args:
+        model_config (dict): the configuration of the model.
+        backend (str): 'fp32' loads the original checkpoint,
+            'int8' the quantized copy written by export_quantized.
+
+    Returns:
+        the fairseq hub model.
+    """
+
+    if backend == 'fp32':
+        from fairseq.models.transformer import TransformerModel
+        return TransformerModel.from_pretrained(
+            model_config['path'],
+            checkpoint_file=model_config['checkpoint_file'],
+            bpe='sentencepiece',
+            sentencepiece_model=model_config['sentencepiece_model'])
+
+    import torch
+    from fairseq import tasks
+    from fairseq.hub_utils import GeneratorHubInterface
+    from omegaconf import open_dict
+
+    path = checkpoint_path(model_config, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No {backend} model {path} found, export it '
+                                'with "python normalize.py export".')
+    # the quantized model is stored as a whole module, not as a state dict
+    state = torch.load(path, map_location='cpu', weights_only=False)
+    cfg = state['cfg']
+    with open_dict(cfg):
+        cfg.task.data = os.path.abspath(model_config['path'])
+        cfg.bpe.sentencepiece_model = model_config['sentencepiece_model']
+    task = tasks.setup_task(cfg.task)
+    model = state['model']
+    model.eval()
+    return GeneratorHubInterface(cfg, task, [model])
+
+
+def export_quantized(model_config):
+    """
+    Write a dynamically quantized int8 copy of a model.
+
+    Args:
+        model_config (dict): the configuration of the model.
+
+    Returns:
+        str: the path of the quantized checkpoint.
+    """
+
+    import torch
+
+    hub = load_model(model_config)
+    model = torch.quantization.quantize_dynamic(
+        hub.models[0].eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    path = checkpoint_path(model_config, 'int8')
+    torch.save({'cfg': hub.cfg, 'model': model}, path)
+    return path
+
+
+def export_torchscript(model_config, backend='fp32', beam=5):
+    """
+    Write a TorchScript version of the beam search generator of a model.
+    The scripted generator takes subword token ids; sentencepiece encoding
+    and dictionary lookups are left to the caller.
+
+    Args:
+        model_config (dict): the configuration of the model.
+        backend (str): the backend whose model is scripted.
+        beam (int): the beam size of the generator.
+
+    Returns:
+        str: the path of the TorchScript file.
+    """
+
+    import torch
+    from fairseq.sequence_generator import SequenceGenerator
+
+    hub = load_model(model_config, backend)
+    generator = SequenceGenerator(hub.models, hub.tgt_dict, beam_size=beam)
+    scripted = torch.jit.script(generator)
+    path = os.path.splitext(checkpoint_path(model_config, backend))[0] + '.ts'
+    scripted.save(path)
+    return path
+
+
+def parse_args(argv):
+    """
+    Parse the command-line arguments of the export mode.
+    """
+
+    parser = argparse.ArgumentParser(prog='normalize.py export',
+                                     description='Export the normalizer '\
+                                     'models for faster CPU inference.')
+    parser.add_argument('--config', '-c', type=str, required=True,
+                        help='JSON file indicating the parameters for the '\
+                        'main model and the fallback model.')
+    parser.add_argument('--models', nargs='+',
+                        default=['main_model', 'fallback_model'],
+                        help='Configuration keys of the models to export '\
+                        '(default: main_model fallback_model).')
+    parser.add_argument('--torchscript', action='store_true',
+                        help='Also write a TorchScript version of the '\
+                        'quantized beam search generator.')
+    parser.add_argument('--beam', type=int, default=5,
+                        help='Beam size of the TorchScript generator '\
+                        '(default: 5).')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """
+    Export the models of a configuration.
+
+    Args:
+        argv (list): the command-line arguments after "export".
+    """
+
+    from normalize import configure_logging
+
+    args = parse_args(argv)
+    configure_logging('INFO')
+
+    with open(args.config) as jsonfile:
+        config = json.load(jsonfile)
+
+    for name in args.models:
+        start = time.perf_counter()
+        path = export_quantized(config[name])
+        logger.info('Wrote %s (%.1f MB) in %.1f s.', path,
+                    os.path.getsize(path) / 2**20, time.perf_counter() - start)
+        if args.torchscript:
+            path = export_torchscript(config[name], 'int8', args.beam)
+            logger.info('Wrote %s.', path)
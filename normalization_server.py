@@ -0,0 +1,305 @@
+"""
+Serve a normalizer over HTTP, either on a TCP port or on a Unix socket.
+
+The models are loaded once and stay resident. Requests of concurrent clients
+are collected by a micro-batcher, which waits at most --max-wait milliseconds
+for up to --max-batch-size sentences and normalizes them as a single batch.
+
+Endpoints:
+- POST /normalize with {"text": "..."} or {"texts": ["...", ...]}
+    returns {"normalized": "..."} or {"normalized": ["...", ...]}
+- GET /health returns {"status": "ok"}
+- GET /metrics returns the queue depth, batch sizes and latencies
+
+Usage: python normalize.py serve -c config_normalizer.json [--port 8080]
+"""
+
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+from instrumentation import percentile
+from normalize import Normalizer, configure_logging, logger
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class MicroBatcher():
+    """
+    Collect sentences of concurrent requests and normalize them in batches.
+
+    Args:
+        normalizer (Normalizer): the normalizer.
+        max_batch_size (int): maximum number of sentences per batch.
+        max_wait (float): maximum time in seconds a sentence waits
+            for further sentences before its batch is normalized.
+        max_tokens (int): maximum number of subword tokens per model batch.
+
+    Attributes:
+        queue: the pending sentences with their futures.
+        batch_sizes: sizes of the most recent batches.
+        latencies: latencies of the most recent requests in seconds.
+    """
+
+    def __init__(self, normalizer, max_batch_size, max_wait, max_tokens=None):
+        self.normalizer = normalizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_tokens = max_tokens
+        self.queue = asyncio.Queue()
+        # the models are used by one thread only
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batch_sizes = deque(maxlen=10000)
+        self.latencies = deque(maxlen=10000)
+        self.num_requests = 0
+        self.num_sentences = 0
+
+    async def normalize(self, texts):
+        """
+        Normalize the sentences of a request.
+
+        Args:
+            texts (list): the sentences.
+
+        Returns:
+            list: the normalized sentences.
+        """
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self.queue.put_nowait((text, future))
+        normalized = await asyncio.gather(*futures)
+        self.latencies.append(time.perf_counter() - start)
+        self.num_requests += 1
+        return normalized
+
+    async def run(self):
+        """
+        Normalize batches of queued sentences until cancelled.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            texts = [text for text, _ in batch]
+            try:
+                normalized = await loop.run_in_executor(
+                    self.executor, lambda: self.normalizer.normalize_batch(
+                        texts, max_tokens=self.max_tokens))
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, normalized):
+                if not future.done():
+                    future.set_result(result)
+            self.batch_sizes.append(len(batch))
+            self.num_sentences += len(batch)
+
+    async def metrics(self):
+        """
+        Get the current metrics. The statistics of the normalizer are read
+        on the thread of the models, since normalize_batch updates them.
+
+        Returns:
+            dict: the queue depth, request and sentence counts, batch sizes
+                and p50/p99 request latencies in milliseconds.
+        """
+
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(self.executor,
+                                           self.normalizer.stats)
+        latencies = list(self.latencies)
+        batch_sizes = list(self.batch_sizes)
+        to_ms = lambda value: None if value is None else round(value * 1000, 3)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'requests': self.num_requests,
+            'sentences': self.num_sentences,
+            'batches': len(batch_sizes),
+            'batch_size_mean': (sum(batch_sizes) / len(batch_sizes)
+                                if batch_sizes else None),
+            'batch_size_max': max(batch_sizes, default=None),
+            'latency_p50_ms': to_ms(percentile(latencies, 0.5)),
+            'latency_p99_ms': to_ms(percentile(latencies, 0.99)),
+            **stats,
+        }
+
+
+class NormalizationServer():
+    """
+    Minimal HTTP/1.1 server for a micro-batcher.
+
+    Args:
+        batcher (MicroBatcher): the micro-batcher.
+    """
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, method, path, body):
+        """
+        Handle a request.
+
+        Returns:
+            tuple: the status code and the JSON-serializable response.
+        """
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, await self.batcher.metrics()
+        if path != '/normalize':
+            return 404, {'error': f'Unknown path {path}.'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST to normalize text.'}
+        try:
+            request = json.loads(body)
+            if 'texts' in request:
+                texts = request['texts']
+                single = False
+            else:
+                texts = [request['text']]
+                single = True
+            if not isinstance(texts, list) \
+                    or not all(isinstance(text, str) for text in texts):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': 'Expected {"text": "..."} '
+                                  'or {"texts": ["...", ...]}.'}
+        normalized = await self.batcher.normalize(texts)
+        return 200, {'normalized': normalized[0] if single else normalized}
+
+    async def serve_client(self, reader, writer):
+        """
+        Read requests from a connection and answer them until the
+        client closes the connection.
+        """
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get('content-length', 0)))
+                try:
+                    status, response = await self.handle(
+                        method, path.split('?')[0], body)
+                except Exception as error:
+                    status, response = 500, {'error': str(error)}
+                payload = json.dumps(response, ensure_ascii=False).encode()
+                writer.write(f'HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n'
+                             'Content-Type: application/json; charset=utf-8\r\n'
+                             f'Content-Length: {len(payload)}\r\n\r\n'
+                             .encode() + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(normalizer, args):
+    """
+    Start the micro-batcher and the HTTP server and run them forever.
+    """
+
+    batcher = MicroBatcher(normalizer, args.max_batch_size,
+                           args.max_wait / 1000, args.max_tokens)
+    server = NormalizationServer(batcher)
+    batch_task = asyncio.create_task(batcher.run())
+    if args.socket:
+        listener = await asyncio.start_unix_server(server.serve_client,
+                                                   path=args.socket)
+        logger.info('Serving on unix socket %s.', args.socket)
+    else:
+        listener = await asyncio.start_server(server.serve_client,
+                                              args.host, args.port)
+        logger.info('Serving on http://%s:%d.', args.host, args.port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+def parse_args(argv):
+    """
+    Parse the command-line arguments of the serve mode.
+    """
+
+    parser = argparse.ArgumentParser(prog='normalize.py serve',
+                                     description='Serve a normalizer over HTTP.')
+    parser.add_argument('--config', '-c', type=str, required=True,
+                        help='JSON file indicating the parameters for the '\
+                        'main model and the fallback model.')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Host to listen on (default: 127.0.0.1).')
+    parser.add_argument('--port', '-p', type=int, default=8080,
+                        help='Port to listen on (default: 8080).')
+    parser.add_argument('--socket', type=str, default=None,
+                        help='Listen on this Unix socket instead of a port.')
+    parser.add_argument('--max-batch-size', type=int, default=64,
+                        help='Maximum number of sentences per batch '\
+                        '(default: 64).')
+    parser.add_argument('--max-wait', type=float, default=10,
+                        help='Maximum time in milliseconds a sentence waits '\
+                        'for further sentences (default: 10).')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help='Maximum number of subword tokens per batch '\
+                        'of the main model.')
+    parser.add_argument('--log-level', type=str, default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Level of the diagnostics written to stderr '\
+                        '(default: INFO).')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """
+    Load a normalizer and serve it until interrupted.
+
+    Args:
+        argv (list): the command-line arguments after "serve".
+    """
+
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+
+    with open(args.config) as jsonfile:
+        config = json.load(jsonfile)
+
+    normalizer = Normalizer(config)
+    normalizer.warmup()
+    try:
+        asyncio.run(serve(normalizer, args))
+    except KeyboardInterrupt:
+        pass
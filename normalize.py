@@ -5,17 +5,56 @@ The script guarantees a one-to-one alignment between an input string
 and its normalization. This is done using two different models:
 The main model translates full sequences. If it fails to generate a one-to-one
 alignment between the input and the output, the fallback model is used
-to generate a normalization of each word separately.
+to generate a normalization of each misaligned word separately.
 
 The script can handle XML tags and will simply skip them during normalization.
+
+With "serve" as first argument, the normalizer is kept in memory and served
+over HTTP (see normalization_server.py).
 """
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import importlib
 import json
+import logging
+import lzma
+import os
 import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from scripts.prepare_word_with_context_data import context_windows
+from scripts.word_tokenizer import TOKENIZER_NAMES, get_tokenizer
+from alignment import partial_alignment
+from checkpoint import Checkpoint
+from instrumentation import Instrumentation, SamplingProfiler
+from lexicon import Lexicon, LexiconMiner
+from model_export import BACKENDS, checkpoint_path, load_model
+from translation_cache import TranslationCache, file_fingerprint
+
+logger = logging.getLogger('normalize')
+
+# Patterns of the preprocessing and postprocessing steps.
+BRACKET_BEFORE = re.compile(r'(.+)\[([^\[\]]*?)\??\]')
+BRACKET_AFTER = re.compile(r'\[([^\[\]]*?)\??\](.+)')
+TAG_AFTER_TOKEN = re.compile(r'(?<=\S)(<[^<>]*>[^<>]*</[^<>]*>)')
+TAG_BEFORE_TOKEN = re.compile(r'(<[^<>]*>[^<>]*</[^<>]*>)(?=\S)')
+TOKENIZED_TAG_PAIR = re.compile(r'< ([^<>]*) > ([^<>]*) < (/[^<>]*) >')
+TOKENIZED_TAG = re.compile(r'< ([^<>]*) >')
+TOKENIZED_BRACKETS = re.compile(r'\[ ([^\[\]]*) \]')
+SPACE_BEFORE_PUNCTUATION = re.compile(r' +(?=[\.,;:!\?\)“’])')
+SPACE_AFTER_PUNCTUATION = re.compile(r'(?<=[„\(]) +')
 
-from fairseq.models.transformer import TransformerModel
-from nltk.tokenize import word_tokenize
+# Timers that are measured within other timers (tokenize within preprocess).
+NESTED_TIMERS = frozenset(['tokenize'])
+
+# Generation arguments for the fallback model, which predicts a single word.
+SHORT_FALLBACK_DECODING = {'beam': 2, 'max_len_a': 0, 'max_len_b': 20}
 
 
 class Normalizer():
@@ -26,24 +65,185 @@ class Normalizer():
         config (str): path to a JSON configuration file.
 
     Attributes:
+        config (dict): the configuration.
+        timings (dict): seconds spent on importing fairseq, loading
+            each model and the warmup inference.
         main_model: the main model which translates full sequences.
         fallback_model: the fallback model used when the main model
-            fails to generate a one-to-one alignment.
+            fails to generate a one-to-one alignment, loaded lazily.
+        fallback_decoding (dict): generation arguments of the fallback model,
+            e.g. a smaller beam and maximum output length.
+        partial_fallback (bool): only normalize the misaligned words
+            with the fallback model.
+        fallback_context (int): number of context words on either side
+            of a word in the input of the fallback model (default: 5,
+            as in prepare_word_with_context_data.py).
+        max_chunk_tokens (int): maximum number of tokens the main model
+            translates at once, longer sentences are split into chunks.
+        backend (str): 'fp32' for the original checkpoints or 'int8' for
+            the quantized copies written by "normalize.py export".
         charset (str): set of valid characters in the input.
+        invalid_characters: compiled pattern matching characters
+            which are not in charset.
+        word_tokenize: the tokenizer function ('nltk' or 'fast').
+        lexicon (Lexicon): optional lexicon, used instead of the models for
+            sentences whose tokens are all covered.
+        lexicon_miner (LexiconMiner): collects the word normalizations of
+            the main model if "mine_lexicon" is set.
+        main_cache (TranslationCache): cache for the main model, if enabled.
+        fallback_cache (TranslationCache): cache for the fallback model,
+            if enabled.
+        instrumentation (Instrumentation): stage timers and counters,
+            enabled by "instrumentation".
     """
 
     def __init__(self, config):
-        self.main_model = TransformerModel.from_pretrained(
-            config['main_model']['path'],
-            checkpoint_file=config['main_model']['checkpoint_file'],
-            bpe='sentencepiece',
-            sentencepiece_model=config['main_model']['sentencepiece_model'])
-        self.fallback_model = TransformerModel.from_pretrained(
-            config['fallback_model']['path'],
-            checkpoint_file=config['fallback_model']['checkpoint_file'],
-            bpe='sentencepiece',
-            sentencepiece_model=config['fallback_model']['sentencepiece_model'])
+        self.config = config
+        self.timings = {}
+        self.instrumentation = Instrumentation(config.get('instrumentation',
+                                                          False))
+        self.backend = config.get('backend', 'fp32')
+        self.main_model = self._load_model('main_model')
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+        self.fallback_decoding = config.get('fallback_decoding', {'beam': 5})
+        self.partial_fallback = config.get('partial_fallback', True)
+        self.fallback_context = config.get('fallback_context', 5)
+        self.max_chunk_tokens = config.get('max_chunk_tokens')
         self.charset = config['charset']
+        self.invalid_characters = re.compile(f'[^{self.charset} <>]')
+        self.word_tokenize = get_tokenizer(config.get('tokenizer', 'nltk'))
+        self.lexicon = None
+        if config.get('lexicon'):
+            self.lexicon = Lexicon(config['lexicon']['path'],
+                                   config['lexicon'].get('threshold', 0.99),
+                                   config['lexicon'].get('min_count', 5))
+        self.lexicon_miner = LexiconMiner() if config.get('mine_lexicon') \
+            else None
+        self.main_cache = None
+        self.fallback_cache = None
+        if config.get('cache'):
+            self.main_cache = self._build_cache(config['main_model'],
+                                                {'beam': 5}, config['cache'],
+                                                self.backend)
+        if config.get('preload_fallback'):
+            threading.Thread(target=lambda: self.fallback_model,
+                             daemon=True).start()
+
+    def _load_model(self, name):
+        """
+        Load a model from its configuration and record the loading time.
+        fairseq is only imported when the first model is loaded.
+
+        Args:
+            name (str): the configuration key of the model,
+                'main_model' or 'fallback_model'.
+
+        Returns:
+            the fairseq hub model.
+        """
+
+        start = time.perf_counter()
+        # fairseq is imported here only to time the import separately
+        # from the loading of the model
+        importlib.import_module('fairseq')
+        loaded = time.perf_counter()
+        self.timings.setdefault('import', loaded - start)
+        model = load_model(self.config[name], self.backend)
+        self.timings[name] = time.perf_counter() - loaded
+        return model
+
+    @property
+    def fallback_model(self):
+        """
+        The fallback model, loaded when it is needed for the first time
+        (or in the background if "preload_fallback" is set).
+        """
+
+        if self._fallback_model is None:
+            with self._fallback_lock:
+                if self._fallback_model is None:
+                    model = self._load_model('fallback_model')
+                    if self.config.get('cache'):
+                        self.fallback_cache = self._build_cache(
+                            self.config['fallback_model'],
+                            self.fallback_decoding, self.config['cache'],
+                            self.backend)
+                    self._fallback_model = model
+        return self._fallback_model
+
+    def warmup(self):
+        """
+        Run a first inference of the main model and record its duration.
+        """
+
+        start = time.perf_counter()
+        self.main_model.translate('warmup')
+        self.timings['warmup'] = time.perf_counter() - start
+
+    @staticmethod
+    def _build_cache(model_config, decoding, cache_config, backend='fp32'):
+        """
+        Create a translation cache for a model.
+
+        Args:
+            model_config (dict): the configuration of the model.
+            decoding (dict): the generation arguments of the model.
+            cache_config (dict): the configuration of the cache with the
+                keys "size" (entries in memory) and "path" (optional sqlite
+                database).
+            backend (str): the backend of the model.
+
+        Returns:
+            TranslationCache: the cache.
+        """
+
+        fingerprint = file_fingerprint(
+            [checkpoint_path(model_config, backend),
+             model_config['sentencepiece_model']], decoding)
+        return TranslationCache(fingerprint, cache_config.get('size', 100000),
+                                cache_config.get('path'))
+
+    def cache_stats(self, reset=False):
+        """
+        Get the hit and miss counters of the translation caches.
+
+        Args:
+            reset (bool): reset the counters afterwards.
+
+        Returns:
+            dict: the counters per model, empty if caching is disabled.
+        """
+
+        stats = {}
+        for name, cache in [('main', self.main_cache),
+                            ('fallback', self.fallback_cache)]:
+            if cache is not None:
+                stats[name] = dict(cache.stats)
+                if reset:
+                    cache.stats = dict.fromkeys(cache.stats, 0)
+        return stats
+
+    def stats(self, reset=False):
+        """
+        Get the counters of the translation caches and the lexicon,
+        and the stage timers and counters if instrumentation is enabled.
+
+        Args:
+            reset (bool): reset the counters afterwards.
+
+        Returns:
+            dict: the cache counters per model, the lexicon counters and
+                the "timers" and "counters" of the instrumentation.
+        """
+
+        stats = {'cache': self.cache_stats(reset), 'lexicon': {}}
+        if self.lexicon is not None:
+            stats['lexicon'] = dict(self.lexicon.stats)
+            if reset:
+                self.lexicon.stats = dict.fromkeys(self.lexicon.stats, 0)
+        stats.update(self.instrumentation.stats(reset))
+        return stats
 
     def remove_invalid_characters(self, text):
         """
@@ -56,11 +256,14 @@ class Normalizer():
             str: The processed string.
         """
 
-        match = re.findall(f'[^{self.charset} <>]', text)
+        match = self.invalid_characters.findall(text)
         if match:
-            print(f'WARNING: Found invalid character(s) {match} in input:'\
-                   '\n{text}\nCharacter(s) will be removed from input.')
-            text = re.sub(f'[^{self.charset} <>]', '', text)
+            self.instrumentation.count('invalid_character_removals',
+                                       len(match))
+            logger.warning('Found invalid character(s) %s in input:\n%s\n'
+                           'Character(s) will be removed from input.',
+                           match, text)
+            text = self.invalid_characters.sub('', text)
             # TODO: add test if length is the same as originally
         return text
 
@@ -83,33 +286,40 @@ class Normalizer():
 
         text = text.lower()
         text = self.remove_invalid_characters(text)
-        text = ' '.join([re.sub(r'(.+)\[([^\[\]]*?)\??\]', r'\1\2', token)
-                         for token in text.split()])
-        text = ' '.join([re.sub(r'\[([^\[\]]*?)\??\](.+)', r'\1\2', token)
-                         for token in text.split()])
-        text = re.sub(r'(?<=\S)(<[^<>]*>[^<>]*</[^<>]*>)', r' ## \1', text)
-        text = re.sub(r'(<[^<>]*>[^<>]*</[^<>]*>)(?=\S)', r'\1 ## ', text)
-        text = ' '.join(word_tokenize(text))
-        text = re.sub(r'< ([^<>]*) > ([^<>]*) < (/[^<>]*) >',
-                      r'<\1>\2<\3>', text)
-        text = re.sub(r'< ([^<>]*) >', r'<\1>', text)
-        text = re.sub(r'# #', r'##', text)
-        text = re.sub(r'\[ ([^\[\]]*) \]',
-                      lambda x: '[' + x.group(1).replace(' ', '@@') + ']',
-                      text)
-
-        ignore_tokens = [(index, token)
-                  for (index, token) in enumerate(text.split())
-                  if token.startswith('<') and token.endswith('>')
-                  or token.startswith('#') and token.endswith('#')
-                  or token.startswith('[') and token.endswith(']')]
-
-        model_input = ' '.join([token for token in text.split()
-                       if not token.startswith('<') and not token.endswith('>')
-                       and not token.startswith('#') and not token.endswith('#')
-                       and not token.startswith('[') and not token.endswith(']')])
-
-        return model_input, ignore_tokens
+        tokens = text.split()
+        if '[' in text:
+            tokens = [BRACKET_AFTER.sub(r'\1\2', BRACKET_BEFORE.sub(r'\1\2', token))
+                      if '[' in token else token for token in tokens]
+        text = ' '.join(tokens)
+        if '<' in text:
+            text = TAG_AFTER_TOKEN.sub(r' ## \1', text)
+            text = TAG_BEFORE_TOKEN.sub(r'\1 ## ', text)
+        with self.instrumentation.timer('tokenize'):
+            text = ' '.join(self.word_tokenize(text))
+        if '<' in text:
+            text = TOKENIZED_TAG_PAIR.sub(r'<\1>\2<\3>', text)
+            text = TOKENIZED_TAG.sub(r'<\1>', text)
+        text = text.replace('# #', '##')
+        if '[' in text:
+            text = TOKENIZED_BRACKETS.sub(
+                lambda x: '[' + x.group(1).replace(' ', '@@') + ']', text)
+
+        # Tokens within tags or square brackets and ## markers are ignored.
+        # Tokens which only start or end with one of these characters
+        # are dropped.
+        ignore_tokens = []
+        model_input = []
+        for index, token in enumerate(text.split()):
+            first = token[0]
+            last = token[-1]
+            if first == '<' and last == '>' or first == '#' and last == '#' \
+                    or first == '[' and last == ']':
+                ignore_tokens.append((index, token))
+            elif first not in '<#[' and last not in '>#]':
+                model_input.append(token)
+        self.instrumentation.count('ignored_tokens', len(ignore_tokens))
+
+        return ' '.join(model_input), ignore_tokens
 
     def postprocess(self, model_output, ignore_tokens):
         """
@@ -120,21 +330,139 @@ class Normalizer():
         Args:
             model_output: A normalized string.
             ignore_tokens: A list with ignored tokens (text in tags
-                and in square brackets) and their index.
+                and in square brackets) and their index, sorted by index.
 
         Returns:
             The string with the ignored tokens inserted at their index.
         """
 
-        model_output = model_output.split()
-        for index, token in ignore_tokens:
-            model_output.insert(index, token)
-        model_output = ' '.join(model_output)
-        model_output = re.sub(' ## ', '', model_output)
-        model_output = re.sub(r' +(?=[\.,;:!\?\)“’])', '', model_output)
-        model_output = re.sub(r'(?<=[„\(]) +', '', model_output)
-        model_output = re.sub(r'@@', ' ', model_output)
-        return model_output
+        tokens = model_output.split()
+        if ignore_tokens:
+            merged = []
+            position = 0
+            for index, token in ignore_tokens:
+                if index > len(merged):
+                    end = position + index - len(merged)
+                    merged.extend(tokens[position:end])
+                    position = end
+                merged.append(token)
+            merged.extend(tokens[position:])
+            tokens = merged
+        model_output = ' '.join(tokens).replace(' ## ', '')
+        model_output = SPACE_BEFORE_PUNCTUATION.sub('', model_output)
+        model_output = SPACE_AFTER_PUNCTUATION.sub('', model_output)
+        return model_output.replace('@@', ' ')
+
+    def translate(self, model, sentences, max_tokens=None, max_sentences=None,
+                  cache=None, beam=5, **kwargs):
+        """
+        Translate a list of strings with batched inference.
+
+        The strings are encoded once, grouped into buckets of similar length
+        and each bucket is passed to the model as a single batch.
+        Strings found in the cache, and repetitions of the same string,
+        are not translated again.
+
+        Args:
+            model: a fairseq hub model, e.g. self.main_model.
+            sentences (list): the strings to translate.
+            max_tokens (int): maximum number of (padded) subword tokens
+                per batch.
+            max_sentences (int): maximum number of strings per batch.
+            cache (TranslationCache): optional cache for the model.
+            beam (int): the beam size.
+            **kwargs: further generation arguments, e.g. max_len_b.
+
+        Returns:
+            list: the translations in the order of the input strings.
+        """
+
+        translated = cache.lookup(sentences) if cache is not None else {}
+        pending = list(dict.fromkeys(sentence for sentence in sentences
+                                     if sentence not in translated))
+        tokenized = [model.encode(sentence) for sentence in pending]
+        lengths = [tokens.numel() for tokens in tokenized]
+        new = {}
+        name = 'main' if model is self.main_model else 'fallback'
+        self.instrumentation.count(f'{name}_decoded_sentences', len(pending))
+        for bucket in length_buckets(lengths, max_tokens, max_sentences):
+            self.instrumentation.count(f'{name}_batches')
+            hypos = model.generate([tokenized[index] for index in bucket],
+                                   beam=beam, **kwargs)
+            for index, hypo in zip(bucket, hypos):
+                new[pending[index]] = model.decode(hypo[0]['tokens'])
+        if cache is not None:
+            cache.store(new)
+        translated.update(new)
+        return [translated[sentence] for sentence in sentences]
+
+    def fallback_windows(self, model_input, positions=None):
+        """
+        Build the input of the fallback model for a preprocessed string:
+        one window per word, with the word marked by <token> tags
+        and self.fallback_context words of context on either side,
+        as in the training data of the fallback model.
+
+        Args:
+            model_input (str): the preprocessed string.
+            positions (list): optional positions of the words
+                (default: all words).
+
+        Returns:
+            list: one window string per word.
+        """
+
+        return list(context_windows(model_input.lower().split(),
+                                    self.fallback_context, positions))
+
+    def fallback(self, texts, model_inputs, max_tokens=None,
+                 max_sentences=None, positions=None):
+        """
+        Normalize words of some strings separately with the fallback model.
+
+        The windows of all strings are decoded together in batches.
+
+        Args:
+            texts (list): the original strings (only used for reporting).
+            model_inputs (list): the preprocessed strings.
+            max_tokens (int): maximum number of subword tokens per batch.
+            max_sentences (int): maximum number of windows per batch.
+            positions (list): optional list with the positions of the words
+                to normalize in each string (default: all words).
+
+        Returns:
+            list: the predictions for the selected words of each string.
+        """
+
+        if positions is None:
+            positions = [None] * len(model_inputs)
+        windows = [self.fallback_windows(model_input, line_positions)
+                   for model_input, line_positions
+                   in zip(model_inputs, positions)]
+        self.instrumentation.count('fallback_invocations')
+        self.instrumentation.count('fallback_sentences', len(texts))
+        self.instrumentation.count('fallback_windows',
+                                   sum(len(line_windows)
+                                       for line_windows in windows))
+        fallback_model = self.fallback_model
+        predictions = self.translate(
+            fallback_model,
+            [window for line_windows in windows for window in line_windows],
+            max_tokens, max_sentences, self.fallback_cache,
+            **self.fallback_decoding)
+
+        line_predictions = []
+        start = 0
+        for text, model_input, line_windows in zip(texts, model_inputs, windows):
+            logger.info('Fallback model is used for %d of %d words of:\n%s',
+                        len(line_windows), len(model_input.split()), text)
+            line_predictions.append(predictions[start:start+len(line_windows)])
+            start += len(line_windows)
+            if logger.isEnabledFor(logging.DEBUG):
+                for window, prediction in zip(line_windows,
+                                              line_predictions[-1]):
+                    logger.debug('%s\n%s', window, prediction)
+        return line_predictions
 
     def normalize(self, text):
         """
@@ -150,28 +478,537 @@ class Normalizer():
             str: The normalized string.
         """
 
-        model_input, ignore_tokens = self.preprocess(text)
+        return self.normalize_batch([text])[0]
+
+    def normalize_batch(self, texts, max_tokens=None, max_sentences=None):
+        """
+        Normalize a list of strings with batched inference.
+
+        Strings longer than max_chunk_tokens are split into chunks, which are
+        translated in the same batches and stitched together afterwards.
+        Every chunk is checked for a one-to-one alignment separately.
+        The words of all strings that fail the check are then normalized
+        together by the fallback model: only the misaligned words around
+        merged or split words if "partial_fallback" is set (default),
+        otherwise all words.
+
+        Args:
+            texts (list): the strings to normalize.
+            max_tokens (int): maximum number of subword tokens per batch.
+            max_sentences (int): maximum number of strings per batch.
+
+        Returns:
+            list: the normalized strings in the order of the input strings.
+        """
+
+        instrumentation = self.instrumentation
+        instrumentation.count('sentences', len(texts))
+        with instrumentation.timer('preprocess'):
+            preprocessed = [self.preprocess(text) for text in texts]
+        model_inputs = [model_input for model_input, _ in preprocessed]
+
+        # use lexicon for sentences whose tokens are all covered
+        if self.lexicon is not None:
+            with instrumentation.timer('lexicon'):
+                model_outputs = [self.lexicon.normalize(model_input)
+                                 for model_input in model_inputs]
+        else:
+            model_outputs = [None] * len(model_inputs)
+        pending = [index for index, model_output in enumerate(model_outputs)
+                   if model_output is None]
+
+        # use main model on chunks of the sentences
+        chunks = [(index, chunk_start, chunk)
+                  for index in pending
+                  for chunk_start, chunk in chunk_tokens(
+                      model_inputs[index].split(), self.max_chunk_tokens)]
+        instrumentation.count('chunks', len(chunks))
+        with instrumentation.timer('main_translate'):
+            translations = self.translate(
+                self.main_model, [' '.join(chunk) for _, _, chunk in chunks],
+                max_tokens, max_sentences, self.main_cache)
+
+        # stitch the chunks together and find the misaligned words
+        aligned = {index: [None] * len(model_inputs[index].split())
+                   for index in pending}
+        positions = {index: [] for index in pending}
+        for (index, chunk_start, chunk), translation in zip(chunks,
+                                                           translations):
+            output = translation.split()
+            if len(output) == len(chunk):
+                chunk_aligned = output
+                misaligned = []
+            elif self.partial_fallback:
+                # keep the aligned words of the main model
+                with instrumentation.timer('alignment'):
+                    chunk_aligned, misaligned = partial_alignment(chunk,
+                                                                  output)
+            else:
+                chunk_aligned = [None] * len(chunk)
+                misaligned = range(len(chunk))
+            aligned[index][chunk_start:chunk_start+len(chunk)] = chunk_aligned
+            positions[index].extend(chunk_start + position
+                                    for position in misaligned)
+
+        # use fallback model where main model failed
+        failed = [index for index in pending if positions[index]]
+        for index in pending:
+            if not positions[index]:
+                model_outputs[index] = ' '.join(aligned[index])
+                if self.lexicon_miner is not None:
+                    self.lexicon_miner.add(model_inputs[index],
+                                           model_outputs[index])
+        if failed:
+            with instrumentation.timer('fallback'):
+                fallback_outputs = self.fallback(
+                    [texts[index] for index in failed],
+                    [model_inputs[index] for index in failed],
+                    max_tokens, max_sentences,
+                    [positions[index] for index in failed])
+            for index, predictions in zip(failed, fallback_outputs):
+                for position, prediction in zip(positions[index], predictions):
+                    aligned[index][position] = prediction
+                model_outputs[index] = ' '.join(aligned[index])
+
+        with instrumentation.timer('postprocess'):
+            return [self.postprocess(model_output, ignore_tokens)
+                    for model_output, (_, ignore_tokens)
+                    in zip(model_outputs, preprocessed)]
+
+# Tokens after which a sentence is preferably split into chunks.
+CHUNK_BOUNDARIES = frozenset('.,;:!?')
+
+def chunk_tokens(tokens, max_chunk_tokens=None):
+    """
+    Split a token sequence into chunks of at most max_chunk_tokens tokens.
+    A chunk ends after the last punctuation token within the budget,
+    or at the budget if it contains no punctuation.
+
+    Args:
+        tokens (list): the tokens.
+        max_chunk_tokens (int): the maximum chunk length (default: no limit).
+
+    Returns:
+        list: (start, tokens) tuples with the start index of each chunk.
+    """
+
+    if not max_chunk_tokens or len(tokens) <= max_chunk_tokens:
+        return [(0, tokens)]
+    chunks = []
+    start = 0
+    while len(tokens) - start > max_chunk_tokens:
+        end = start + max_chunk_tokens
+        for position in range(end-1, start, -1):
+            if tokens[position] in CHUNK_BOUNDARIES:
+                end = position + 1
+                break
+        chunks.append((start, tokens[start:end]))
+        start = end
+    chunks.append((start, tokens[start:]))
+    return chunks
+
+def length_buckets(lengths, max_tokens=None, max_sentences=None):
+    """
+    Group sequences of similar length into batches.
+
+    The sequences are sorted by length and split into consecutive buckets
+    such that no bucket exceeds max_sentences sequences or max_tokens
+    tokens, counting the padding to the longest sequence in the bucket.
+    A sequence longer than max_tokens forms a bucket of its own.
+
+    Args:
+        lengths (list): the length of each sequence.
+        max_tokens (int): maximum number of padded tokens per bucket.
+        max_sentences (int): maximum number of sequences per bucket.
+
+    Returns:
+        list: a list of buckets, each a list of indices into lengths.
+    """
+
+    buckets = []
+    bucket = []
+    longest = 0
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        longest = max(longest, lengths[index])
+        if bucket and (max_sentences and len(bucket) >= max_sentences
+                       or max_tokens and longest * (len(bucket)+1) > max_tokens):
+            buckets.append(bucket)
+            bucket = []
+            longest = lengths[index]
+        bucket.append(index)
+    if bucket:
+        buckets.append(bucket)
+    return buckets
+
+def read_windows(infile, window_size):
+    """
+    Read stripped lines from a file in windows of consecutive lines.
+
+    Args:
+        infile: an open text file or any other iterable of lines.
+        window_size (int): the number of lines per window.
+
+    Yields:
+        list: the next window of lines.
+    """
+
+    window = []
+    for line in infile:
+        window.append(line.strip())
+        if len(window) == window_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def normalize_lines(normalizer, lines, outfile, args, report=True,
+                    flush=False, on_write=None, num_sents=0):
+    """
+    Normalize lines and write them to a file, either one by one
+    or in batches if a batch size or a maximum number of tokens is given.
+    In batch mode, at most one window of lines is held in memory.
+
+    Args:
+        normalizer (Normalizer): the normalizer.
+        lines: an iterable of lines.
+        outfile: an open text file to which the normalized lines are written.
+        args: the parsed command-line arguments.
+        report (bool): log the number of processed sentences.
+        flush (bool): flush the output after every line (or window),
+            e.g. when writing to a pipe.
+        on_write: optional function called with the total number of lines
+            after each write, e.g. to record a checkpoint.
+        num_sents (int): the number of lines processed before (when resuming).
+
+    Returns:
+        int: the total number of processed lines.
+    """
+
+    if args.batch_size is None and args.max_tokens is None:
+        for line in lines:
+            num_sents += 1
+            normalized = normalizer.normalize(line.strip())
+            outfile.write(normalized+'\n')
+            if flush:
+                outfile.flush()
+            if on_write is not None:
+                on_write(num_sents)
+            if report and num_sents % 1000 == 0:
+                logger.info('Processed %d sentences.', num_sents)
+    else:
+        for window in read_windows(lines, args.window_size):
+            normalized = normalizer.normalize_batch(
+                window, max_tokens=args.max_tokens,
+                max_sentences=args.batch_size)
+            outfile.write(''.join(text+'\n' for text in normalized))
+            if flush:
+                outfile.flush()
+            num_sents += len(window)
+            if on_write is not None:
+                on_write(num_sents)
+            if report:
+                logger.info('Processed %d sentences.', num_sents)
+    return num_sents
+
+def open_file(path, mode='r'):
+    """
+    Open a text file, which may be compressed with gzip (.gz), xz (.xz)
+    or zstandard (.zst, requires the zstandard package).
+    "-" stands for stdin or stdout.
+
+    Args:
+        path (str): the path of the file or "-".
+        mode (str): 'r' or 'w'.
+
+    Returns:
+        an open text file.
+    """
+
+    if path == '-':
+        stream = sys.stdin if mode == 'r' else sys.stdout
+        # do not close stdin/stdout when the file is closed
+        return open(stream.fileno(), mode, closefd=False)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode+'t')
+    if path.endswith('.xz'):
+        return lzma.open(path, mode+'t')
+    if path.endswith('.zst'):
+        import io
+        import zstandard
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(stream)
+    return open(path, mode)
+
+def is_plain_file(path):
+    """
+    Check whether a path is an uncompressed file (not stdin/stdout).
+    """
+
+    return path != '-' and not path.endswith(('.gz', '.xz', '.zst'))
+
+def shard_file(path, num_shards, start=0):
+    """
+    Split a file into line-aligned byte ranges of similar size.
+
+    Args:
+        path (str): the file to split.
+        num_shards (int): the maximum number of shards.
+        start (int): the offset of the first line to include.
+
+    Returns:
+        list: (start, end) byte offsets of the non-empty shards.
+    """
+
+    size = os.path.getsize(path)
+    offsets = [start]
+    with open(path, 'rb') as infile:
+        for shard in range(1, num_shards):
+            position = max(start + (size-start) * shard // num_shards,
+                           offsets[-1])
+            if position >= size:
+                break
+            infile.seek(position)
+            if position > 0:
+                # move to the start of the next line
+                infile.seek(position-1)
+                infile.readline()
+            offsets.append(min(infile.tell(), size))
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:])
+            if start < end]
+
+class ByteRangeReader():
+    """
+    Iterate over the lines of a byte range of a file.
+
+    Args:
+        path (str): the file to read.
+        start (int): the offset of the first line.
+        end (int): the offset after the last line (default: end of file).
+
+    Attributes:
+        position (int): the offset after the last line that has been read.
+    """
+
+    def __init__(self, path, start=0, end=None):
+        self.path = path
+        self.position = start
+        self.end = end if end is not None else os.path.getsize(path)
+
+    def __iter__(self):
+        with open(self.path, 'rb') as infile:
+            infile.seek(self.position)
+            while self.position < self.end:
+                line = infile.readline()
+                if not line:
+                    break
+                self.position += len(line)
+                yield line.decode('utf-8')
+
+_WORKER_NORMALIZER = None
+
+def _init_worker(config, args):
+    """
+    Load a normalizer in a worker process.
+    """
+
+    global _WORKER_NORMALIZER
+    configure_logging(args.log_level, args.log_file)
+    if args.threads_per_worker:
+        import torch
+        torch.set_num_threads(args.threads_per_worker)
+    _WORKER_NORMALIZER = Normalizer(config)
+    if args.startup_report:
+        _WORKER_NORMALIZER.warmup()
+        log_startup_report(_WORKER_NORMALIZER.timings,
+                           f'Worker {os.getpid()}: ')
+
+def _normalize_shard(args, start, end, shard_path):
+    """
+    Normalize a shard of the source file in a worker process
+    and write it to a temporary file.
+    Return the number of lines and the cache and lexicon counters
+    of the shard.
+    """
+
+    with open(shard_path, 'w') as outfile:
+        num_sents = normalize_lines(_WORKER_NORMALIZER,
+                                    ByteRangeReader(args.source, start, end),
+                                    outfile, args, report=False)
+    return num_sents, _WORKER_NORMALIZER.stats(reset=True)
+
+def normalize_parallel(config, args):
+    """
+    Normalize the source file with several worker processes.
+
+    The source file is split into line-aligned shards. Each worker loads
+    its own normalizer and writes its shards to temporary files, which are
+    appended to the output file in the original order. Only shards that
+    are completely normalized are appended, so a failing worker never
+    leaves partial or reordered output.
+
+    Args:
+        config (dict): the normalizer configuration.
+        args: the parsed command-line arguments.
+
+    Returns:
+        tuple: the number of processed lines and the summed cache and
+            lexicon counters of all workers.
+    """
+
+    checkpoint = None
+    start = 0
+    num_sents = 0
+    if args.resume:
+        checkpoint = Checkpoint(args.source, args.outfile,
+                                args.checkpoint_interval)
+        checkpoint.resume()
+        start = checkpoint.input_offset
+        num_sents = checkpoint.lines
+    shards = shard_file(args.source, args.workers * 4, start)
+    tmpdir = tempfile.mkdtemp(prefix='normalize-',
+                              dir=os.path.dirname(os.path.abspath(args.outfile))
+                              if args.outfile != '-' else None)
+    stats = {}
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers,
+                                 initializer=_init_worker,
+                                 initargs=(config, args)) \
+                as executor, \
+                open_file(args.outfile, 'a' if args.resume else 'w') as outfile:
+            shard_paths = [os.path.join(tmpdir, f'shard.{index}')
+                           for index in range(len(shards))]
+            futures = [executor.submit(_normalize_shard, args, start, end, path)
+                       for (start, end), path in zip(shards, shard_paths)]
+            for future, path, (_, end) in zip(futures, shard_paths, shards):
+                shard_sents, shard_stats = future.result()
+                num_sents += shard_sents
+                add_stats(stats, shard_stats)
+                with open(path) as shardfile:
+                    shutil.copyfileobj(shardfile, outfile)
+                outfile.flush()
+                os.remove(path)
+                if checkpoint is not None:
+                    checkpoint.commit(end, outfile, num_sents)
+                logger.info('Processed %d sentences.', num_sents)
+            if checkpoint is not None:
+                checkpoint.commit(os.path.getsize(args.source), outfile,
+                                  num_sents, complete=True)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return num_sents, stats
+
+def normalize_resumable(normalizer, args):
+    """
+    Normalize the source file and record the progress in a manifest,
+    continuing after the last committed line of a previous run.
+
+    Args:
+        normalizer (Normalizer): the normalizer.
+        args: the parsed command-line arguments.
+
+    Returns:
+        int: the total number of processed lines.
+    """
+
+    checkpoint = Checkpoint(args.source, args.outfile, args.checkpoint_interval)
+    checkpoint.resume()
+    if checkpoint.complete:
+        logger.info('The source file has already been normalized.')
+        return checkpoint.lines
+    reader = ByteRangeReader(args.source, checkpoint.input_offset)
+    with open_file(args.outfile, 'a') as outfile:
+        num_sents = normalize_lines(
+            normalizer, reader, outfile, args, num_sents=checkpoint.lines,
+            on_write=lambda lines: checkpoint.update(reader.position,
+                                                     outfile, lines))
+        checkpoint.commit(reader.position, outfile, num_sents, complete=True)
+    return num_sents
+
+def add_stats(total, stats):
+    """
+    Add (nested) counters to a running total.
+
+    Args:
+        total (dict): the running total, updated in place.
+        stats (dict): counters as returned by Normalizer.stats.
+    """
+
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            add_stats(total.setdefault(name, {}), value)
+        else:
+            total[name] = total.get(name, 0) + value
+
+def log_startup_report(timings, prefix=''):
+    """
+    Log the time spent on starting up a normalizer.
+
+    Args:
+        timings (dict): the timings of a normalizer, see Normalizer.timings.
+        prefix (str): a prefix for the report, e.g. the worker process.
+    """
+
+    names = {'import': 'import fairseq', 'main_model': 'load main model',
+             'fallback_model': 'load fallback model', 'warmup': 'warmup'}
+    report = ', '.join(f'{names[key]} {value:.2f}s'
+                       for key, value in timings.items())
+    logger.info('%sStartup: %s.', prefix, report)
+
+def log_lexicon_stats(stats):
+    """
+    Log the share of sentences and tokens covered by the lexicon.
+
+    Args:
+        stats (dict): the lexicon counters of Normalizer.stats.
+    """
+
+    if stats.get('sentences'):
+        logger.info('Lexicon: %d of %d sentences (%.1f%%) and %d of %d '
+                    'tokens (%.1f%%) covered.', stats['sentences_covered'],
+                    stats['sentences'],
+                    100 * stats['sentences_covered'] / stats['sentences'],
+                    stats['tokens_covered'], stats['tokens'],
+                    100 * stats['tokens_covered'] / max(stats['tokens'], 1))
+
+def log_cache_stats(stats):
+    """
+    Log the hit rate of the translation caches.
+
+    Args:
+        stats (dict): counters as returned by Normalizer.cache_stats.
+    """
+
+    for name, counters in stats.items():
+        lookups = sum(counters.values())
+        hits = counters['memory_hits'] + counters['disk_hits']
+        rate = hits / lookups if lookups else 0
+        logger.info('Cache (%s model): %d memory hits, %d disk hits, '
+                    '%d misses (%.1f%% hit rate).', name,
+                    counters['memory_hits'], counters['disk_hits'],
+                    counters['misses'], 100 * rate)
 
-        # use main model
-        model_output = self.main_model.translate(model_input)
+def log_stage_stats(stats):
+    """
+    Log the stage timers and event counters of the instrumentation.
 
-        # use fallback model if main model failed
-        if len(model_output.split()) != len(model_input.split()):
-            print(f'Fallback model is used for:\n{text}')
-            model_output = []
-            text = model_input.strip().lower().split()
-            text = ['<pad>']*5 + [word.strip() for word in text] + ['<pad>']*5
-            for i in range(len(text)-10):
-                current = ' '.join(text[i:i+5]) + f' <token> {text[i+5]} </token> ' \
-                    + ' '.join(text[i+6:i+11])
-                print(current)
-                prediction = self.fallback_model.translate(current)
-                print(prediction)
-                model_output.append(prediction)
-            model_output = ' '.join(model_output)
+    Args:
+        stats (dict): the "timers" and "counters" of Normalizer.stats.
+    """
 
-        model_output = self.postprocess(model_output, ignore_tokens)
-        return model_output
+    timers = stats.get('timers', {})
+    total = sum(timers[name]['seconds'] for name in timers
+                if name not in NESTED_TIMERS)
+    for name, timer in sorted(timers.items(),
+                              key=lambda item: -item[1]['seconds']):
+        logger.info('Stage %s: %.3fs in %d calls (%.1f%%).', name,
+                    timer['seconds'], timer['calls'],
+                    100 * timer['seconds'] / total if total else 0)
+    for name, value in sorted(stats.get('counters', {}).items()):
+        logger.info('Counter %s: %d.', name, value)
 
 def parse_args():
     """
@@ -179,39 +1016,239 @@ def parse_args():
     """
 
     parser = argparse.ArgumentParser(description='Normalize text.')
-    parser.add_argument('--source', '-s', type=str, required=True,
-                        help='Source file with sequences to normalize.')
-    parser.add_argument('--outfile', '-o', type=str, required=True,
+    parser.add_argument('input', nargs='?', default=None,
+                        help='Source file, alternative to --source.')
+    parser.add_argument('--source', '-s', type=str, default=None,
+                        help='Source file with sequences to normalize, '\
+                        'optionally compressed (.gz, .xz, .zst). '\
+                        '"-" reads from stdin (default).')
+    parser.add_argument('--outfile', '-o', type=str, default='-',
                         help='File to which the normalized sequences '\
-                        'are written.')
+                        'are written, compressed according to its suffix. '\
+                        '"-" writes to stdout (default).')
     parser.add_argument('--config', '-c', type=str, required=True,
                         help='JSON file indicating the parameters for the '\
                         'main model and the fallback model.')
-    return parser.parse_args()
+    parser.add_argument('--batch-size', '-b', type=int, default=None,
+                        help='Maximum number of sentences per batch of the '\
+                        'main model. Activates batched normalization.')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help='Maximum number of subword tokens per batch of '\
+                        'the main model. Activates batched normalization.')
+    parser.add_argument('--window-size', type=int, default=1000,
+                        help='Number of input lines that are preprocessed '\
+                        'and grouped into batches together (default: 1000).')
+    parser.add_argument('--short-fallback', action='store_true',
+                        help='Decode the fallback model with a small beam '\
+                        'and a low maximum output length.')
+    parser.add_argument('--max-chunk-tokens', type=int, default=None,
+                        help='Split sentences with more tokens into chunks '\
+                        'at punctuation marks before translating them.')
+    parser.add_argument('--full-fallback', action='store_true',
+                        help='Normalize all words of a sentence with the '\
+                        'fallback model if the main model fails, not only '\
+                        'the misaligned ones.')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of worker processes. Each worker loads '\
+                        'its own models and normalizes a part of the source '\
+                        'file (default: 1).')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='Number of intra-op threads of torch '\
+                        'in each worker process.')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='Number of translations kept in the in-memory '\
+                        'cache of each model. Activates caching.')
+    parser.add_argument('--cache-db', type=str, default=None,
+                        help='sqlite database in which translations are '\
+                        'cached across runs. Activates caching.')
+    parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                        help='Word tokenizer used in preprocessing '\
+                        '(default: nltk).')
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help='Load the fp32 checkpoints or their int8 '\
+                        'copies written by "normalize.py export" '\
+                        '(default: fp32).')
+    parser.add_argument('--preload-fallback', action='store_true',
+                        help='Load the fallback model in the background '\
+                        'instead of when it is needed for the first time.')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='Print the time spent on imports, loading '\
+                        'the models and a warmup inference.')
+    parser.add_argument('--lexicon', type=str, default=None,
+                        help='Lexicon file with deterministic normalizations. '\
+                        'Sentences whose tokens are all covered skip the '\
+                        'models.')
+    parser.add_argument('--lexicon-threshold', type=float, default=None,
+                        help='Minimum confidence of mined lexicon entries '\
+                        '(default: 0.99).')
+    parser.add_argument('--mine-lexicon', type=str, default=None,
+                        help='Write the word normalizations of the main '\
+                        'model with their confidence to this lexicon file.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Record the progress in OUTFILE.progress.json '\
+                        'and continue after the last committed line '\
+                        'of a previous run.')
+    parser.add_argument('--checkpoint-interval', type=int, default=1000,
+                        help='Minimum number of lines between two progress '\
+                        'records with --resume (default: 1000).')
+    parser.add_argument('--log-level', type=str, default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Level of the diagnostics written to stderr: '\
+                        'DEBUG includes every fallback window, INFO the '\
+                        'progress and fallback sentences (default: INFO).')
+    parser.add_argument('--log-file', type=str, default=None,
+                        help='Write the diagnostics as JSON lines to this '\
+                        'file instead of stderr.')
+    parser.add_argument('--instrument', action='store_true',
+                        help='Record the time of each stage and event '\
+                        'counters and log them at the end.')
+    parser.add_argument('--stats-file', type=str, default=None,
+                        help='Write the cache, lexicon and stage statistics '\
+                        'to this JSON file (implies --instrument).')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Sample the stack during the run and write the '\
+                        'collapsed stacks to this file (for flame graphs).')
+    parser.add_argument('--profile-interval', type=float, default=5,
+                        help='Time between two profiler samples in '\
+                        'milliseconds (default: 5).')
+    args = parser.parse_args()
+    if args.input is not None:
+        if args.source is not None:
+            parser.error('Give the source file either as argument '
+                         'or with --source.')
+        args.source = args.input
+    elif args.source is None:
+        args.source = '-'
+    if args.workers > 1 and not is_plain_file(args.source):
+        parser.error('--workers requires an uncompressed source file.')
+    if args.workers > 1 and args.mine_lexicon:
+        parser.error('--mine-lexicon cannot be combined with --workers.')
+    if args.resume and not (is_plain_file(args.source)
+                            and is_plain_file(args.outfile)):
+        parser.error('--resume requires uncompressed source and output files.')
+    if args.profile and args.workers > 1:
+        parser.error('--profile cannot be combined with --workers.')
+    return args
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as JSON lines.
+    """
+
+    def format(self, record):
+        return json.dumps({'time': record.created,
+                           'level': record.levelname,
+                           'process': record.process,
+                           'message': record.getMessage()},
+                          ensure_ascii=False)
+
+def configure_logging(level='INFO', log_file=None):
+    """
+    Send the diagnostics of the normalizer to stderr or to a JSON log file.
+
+    Args:
+        level (str): the log level, e.g. 'INFO'.
+        log_file (str): optional file to which JSON lines are appended.
+    """
+
+    if log_file:
+        handler = logging.FileHandler(log_file)
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
 
 def main():
     """
-    Initialize a normalizer and process an input file with it.
+    Initialize a normalizer and process an input file with it,
+    or serve it over HTTP if the first argument is "serve",
+    or export the models if the first argument is "export".
     """
 
+    if sys.argv[1:2] == ['serve']:
+        from normalization_server import main as serve
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['export']:
+        from model_export import main as export
+        export(sys.argv[2:])
+        return
+
     args = parse_args()
+    configure_logging(args.log_level, args.log_file)
 
     with open(args.config) as jsonfile:
         config = json.load(jsonfile)
+    if args.short_fallback:
+        config['fallback_decoding'] = SHORT_FALLBACK_DECODING
+    if args.full_fallback:
+        config['partial_fallback'] = False
+    if args.max_chunk_tokens is not None:
+        config['max_chunk_tokens'] = args.max_chunk_tokens
+    if args.tokenizer is not None:
+        config['tokenizer'] = args.tokenizer
+    if args.backend is not None:
+        config['backend'] = args.backend
+    if args.instrument or args.stats_file:
+        config['instrumentation'] = True
+    if args.preload_fallback:
+        config['preload_fallback'] = True
+    if args.lexicon is not None:
+        config['lexicon'] = dict(config.get('lexicon') or {}, path=args.lexicon)
+    if args.lexicon_threshold is not None and config.get('lexicon'):
+        config['lexicon']['threshold'] = args.lexicon_threshold
+    if args.mine_lexicon is not None:
+        config['mine_lexicon'] = True
+    if args.cache_size is not None or args.cache_db is not None:
+        config['cache'] = dict(config.get('cache') or {})
+        if args.cache_size is not None:
+            config['cache']['size'] = args.cache_size
+        if args.cache_db is not None:
+            config['cache']['path'] = args.cache_db
 
-    normalizer = Normalizer(config)
-
-    num_sents = 0
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(args.profile, args.profile_interval / 1000)
+        profiler.start()
 
-    with open(args.source) as infile, open(args.outfile, 'w') as outfile:
-        for line in infile:
-            num_sents += 1
-            normalized = normalizer.normalize(line.strip())
-            outfile.write(normalized+'\n')
-            if num_sents % 1000 == 0:
-                print(f'Processed {num_sents} sentences.\r', end='')
+    if args.workers > 1:
+        normalizer = None
+        num_sents, stats = normalize_parallel(config, args)
+    else:
+        if args.threads_per_worker:
+            import torch
+            torch.set_num_threads(args.threads_per_worker)
+        normalizer = Normalizer(config)
+        if args.startup_report:
+            normalizer.warmup()
+            log_startup_report(normalizer.timings)
+        if args.resume:
+            num_sents = normalize_resumable(normalizer, args)
+        else:
+            with open_file(args.source) as infile, \
+                    open_file(args.outfile, 'w') as outfile:
+                num_sents = normalize_lines(normalizer, infile, outfile, args,
+                                            flush=args.outfile == '-')
+        stats = normalizer.stats()
 
-    print(f'Processed {num_sents} sentences.')
+    logger.info('Processed %d sentences.', num_sents)
+    log_cache_stats(stats.get('cache', {}))
+    log_lexicon_stats(stats.get('lexicon', {}))
+    log_stage_stats(stats)
+    if args.stats_file:
+        with open(args.stats_file, 'w') as stats_file:
+            json.dump(stats, stats_file, indent=2)
+    if profiler is not None:
+        num_samples = profiler.stop()
+        logger.info('Wrote %d profiler samples to %s.', num_samples,
+                    args.profile)
+    if normalizer is not None and normalizer.lexicon_miner is not None:
+        normalizer.lexicon_miner.write(args.mine_lexicon)
+        logger.info('Wrote %d lexicon entries to %s.',
+                    len(normalizer.lexicon_miner.counts), args.mine_lexicon)
 
 if __name__ == '__main__':
     main()
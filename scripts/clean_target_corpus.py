@@ -4,18 +4,346 @@ Clean the target-side corpus:
 - restrict character range
 - tokenize
 - optional: prepare n-to-m mapping
+
+Repeated lines are removed before any other step: exact duplicates by a set of
+64-bit fingerprints (or a Bloom filter with bounded memory), and optionally
+near duplicates by MinHash signatures with locality-sensitive hashing.
+With several workers, the duplicates are removed in the main process,
+so they are detected across the whole corpus.
 """
 
-from random import random, randint
+import argparse
+from array import array
+import hashlib
+import math
+from random import random, randint, Random
 import re
-import sys
 
 import json
-from nltk.tokenize import word_tokenize
 from langid.langid import LanguageIdentifier, model
 import pyphen
 from unidecode import unidecode
 
+from parallel import parallel_map, read_chunks
+from word_tokenizer import TOKENIZER_NAMES, get_tokenizer
+
+# Codepoints whose replacements are computed in advance
+# (Latin-1 Supplement, Latin Extended-A and -B).
+COMMON_CODEPOINTS = range(0x80, 0x250)
+
+DEDUP_MODES = ('none', 'exact', 'bloom')
+
+# Number of hash functions of a MinHash signature and the Mersenne prime
+# of their universal hashing.
+MINHASH_PERMUTATIONS = 64
+MINHASH_PRIME = (1 << 61) - 1
+
+# Number of words per shingle of a MinHash signature.
+SHINGLE_SIZE = 3
+
+
+class TransliterationTable(dict):
+    """
+    Translation table for str.translate which replaces all non-ASCII
+    characters that are not in a charset with their closest ASCII equivalent.
+    The replacements of common codepoints are computed in advance,
+    those of rare codepoints with unidecode when they first occur.
+
+    Args:
+        charset (str): set of valid characters.
+    """
+
+    def __init__(self, charset):
+        super().__init__()
+        self.exceptions = set(c for c in charset if len(c.encode()) > 1)
+        for codepoint in COMMON_CODEPOINTS:
+            self.__missing__(codepoint)
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if codepoint < 0x80 or char in self.exceptions:
+            replacement = char
+        else:
+            replacement = unidecode(char)
+        self[codepoint] = replacement
+        return replacement
+
+
+def fingerprint(text, size=8):
+    """
+    Hash a string to a fingerprint of the given number of bytes.
+
+    Args:
+        text (str): a string.
+        size (int): the size of the fingerprint in bytes.
+
+    Returns:
+        int: the fingerprint.
+    """
+
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=size)
+                          .digest(), 'big')
+
+
+class FingerprintSet():
+    """
+    Compact set of 64-bit fingerprints: an open-addressing hash table with
+    linear probing in an array of unsigned 64-bit integers, where 0 marks an
+    empty slot. The table is doubled when it is two thirds full, so a
+    fingerprint takes 12 to 24 bytes (8 bytes per slot), instead of about
+    70 bytes in a Python set of ints.
+
+    Args:
+        capacity (int): the initial number of slots, a power of two.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.table = array('Q', bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.size = 0
+
+
+    def add(self, key):
+        """
+        Add a fingerprint to the set.
+
+        Args:
+            key (int): a 64-bit fingerprint.
+
+        Returns:
+            bool: True if the fingerprint was added before, False otherwise.
+        """
+
+        # 0 marks an empty slot, so fingerprint 0 is stored as 1
+        key = key or 1
+        table = self.table
+        index = key & self.mask
+        while True:
+            value = table[index]
+            if value == key:
+                return True
+            if not value:
+                break
+            index = (index + 1) & self.mask
+        table[index] = key
+        self.size += 1
+        if 3 * self.size > 2 * len(table):
+            self._grow()
+        return False
+
+
+    def _grow(self):
+        """
+        Double the number of slots and insert the fingerprints again.
+        """
+
+        old = self.table
+        self.table = array('Q', bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        table = self.table
+        for key in old:
+            if key:
+                index = key & self.mask
+                while table[index]:
+                    index = (index + 1) & self.mask
+                table[index] = key
+
+
+class BloomFilter():
+    """
+    Bloom filter of strings with a fixed size in memory.
+
+    Args:
+        capacity (int): the expected number of strings.
+        error_rate (float): the false positive rate at full capacity.
+
+    Attributes:
+        size (int): the number of bits.
+        num_hashes (int): the number of bits set per string.
+        bits (bytearray): the bit array.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate)
+                               / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+
+    def add(self, text):
+        """
+        Add a string to the filter.
+
+        Args:
+            text (str): a string.
+
+        Returns:
+            bool: True if the string was (probably) added before,
+                False otherwise.
+        """
+
+        digest = fingerprint(text, 16)
+        hash1, hash2 = digest >> 64, digest & ((1 << 64) - 1) | 1
+        present = True
+        for index in range(self.num_hashes):
+            position = (hash1 + index * hash2) % self.size
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & bit:
+                present = False
+                self.bits[byte] |= bit
+        return present
+
+
+class MinHashIndex():
+    """
+    Index of the MinHash signatures of strings, which finds strings whose
+    word shingles have a Jaccard similarity above a threshold with
+    locality-sensitive hashing: the signature is split into bands,
+    and two strings are near duplicates if any band is equal.
+    The number of bands is chosen such that the probability of a match is
+    one half at the threshold.
+
+    Args:
+        threshold (float): the Jaccard similarity above which strings are
+            near duplicates.
+        seed (int): seed of the hash functions.
+
+    Attributes:
+        rows (int): the number of values per band.
+        bands (list): the set of the hashes of each band.
+        coefficients (list): the coefficients of the hash functions.
+    """
+
+    def __init__(self, threshold, seed=1):
+        self.rows = min(range(1, MINHASH_PERMUTATIONS + 1),
+                        key=lambda rows: abs(
+                            (rows / MINHASH_PERMUTATIONS) ** (1 / rows)
+                            - threshold))
+        self.bands = [set() for _ in range(MINHASH_PERMUTATIONS // self.rows)]
+        rng = Random(seed)
+        self.coefficients = [(rng.randrange(1, MINHASH_PRIME),
+                              rng.randrange(MINHASH_PRIME))
+                             for _ in range(MINHASH_PERMUTATIONS)]
+
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of the word shingles of a string.
+
+        Args:
+            text (str): a string.
+
+        Returns:
+            list: the signature.
+        """
+
+        words = text.lower().split()
+        shingles = set(' '.join(words[i:i+SHINGLE_SIZE])
+                       for i in range(max(1, len(words) - SHINGLE_SIZE + 1)))
+        hashes = [fingerprint(shingle) for shingle in shingles]
+        return [min((a * value + b) % MINHASH_PRIME for value in hashes)
+                for a, b in self.coefficients]
+
+
+    def add(self, text):
+        """
+        Add a string to the index unless it is a near duplicate.
+
+        Args:
+            text (str): a string.
+
+        Returns:
+            bool: True if the string is a near duplicate of an indexed
+                string, False otherwise.
+        """
+
+        signature = self.signature(text)
+        keys = [hash(tuple(signature[i:i+self.rows]))
+                for i in range(0, len(self.bands) * self.rows, self.rows)]
+        if any(key in band for key, band in zip(keys, self.bands)):
+            return True
+        for key, band in zip(keys, self.bands):
+            band.add(key)
+        return False
+
+
+class Deduplicator():
+    """
+    Streaming removal of repeated lines.
+
+    Args:
+        mode (str): 'exact' to remove exact duplicates with a set of
+            64-bit fingerprints (12 to 24 bytes per distinct line, see
+            FingerprintSet), 'bloom' to remove them with a Bloom filter of
+            fixed size (about 1.8 bytes per line of capacity at an error
+            rate of 0.001), 'none' to keep them.
+        bloom_capacity (int): the expected number of lines of the Bloom filter.
+        bloom_error_rate (float): the false positive rate of the Bloom filter,
+            i.e. the share of unique lines which are removed at full capacity.
+        near_threshold (float): optional Jaccard similarity above which
+            lines are removed as near duplicates.
+
+    Attributes:
+        removed (dict): the number of lines removed by each mechanism.
+    """
+
+    def __init__(self, mode='exact', bloom_capacity=10**7,
+                 bloom_error_rate=0.001, near_threshold=None):
+        self.mode = mode
+        self.fingerprints = FingerprintSet()
+        self.bloom = None
+        if mode == 'bloom':
+            self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self.near = None
+        if near_threshold:
+            self.near = MinHashIndex(near_threshold)
+        self.removed = {'exact': 0, 'bloom': 0, 'near': 0}
+
+
+    def is_duplicate(self, text):
+        """
+        Check if a line repeats a previous line, and remember it otherwise.
+
+        Args:
+            text (str): a line.
+
+        Returns:
+            bool: True if the line is a duplicate, False otherwise.
+        """
+
+        if self.mode == 'exact':
+            if self.fingerprints.add(fingerprint(text)):
+                self.removed['exact'] += 1
+                return True
+        elif self.mode == 'bloom':
+            if self.bloom.add(text):
+                self.removed['bloom'] += 1
+                return True
+        if self.near is not None and self.near.add(text):
+            self.removed['near'] += 1
+            return True
+        return False
+
+
+def get_deduplicator(config):
+    """
+    Create the deduplicator of a configuration.
+
+    Args:
+        config (dict): the configuration with the optional keys "dedup",
+            "bloom_capacity", "bloom_error_rate" and "near_dedup_threshold".
+
+    Returns:
+        Deduplicator: the deduplicator, or None if duplicates are kept.
+    """
+
+    mode = config.get('dedup', 'exact')
+    near_threshold = config.get('near_dedup_threshold')
+    if mode == 'none' and not near_threshold:
+        return None
+    return Deduplicator(mode, config.get('bloom_capacity', 10**7),
+                        config.get('bloom_error_rate', 0.001), near_threshold)
+
 
 class TargetDataCleaner():
     """
@@ -32,9 +360,14 @@ class TargetDataCleaner():
             in order to enlarge the corpus.
         identifier: model to identify the language of a string.
         dic: Pyphen class to syllable-tokenize a string.
+        tokenizer: function which splits a string into word tokens.
+        transliteration (TransliterationTable): translation table
+            of the characters that are not in charset.
+        deduplicator (Deduplicator): the removal of repeated lines,
+            or None if they are kept.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, deduplicator=None):
         self.charset = config['charset_target']
         self.lang = config['lang']
         self.n_to_m = config['n_to_m']
@@ -42,6 +375,9 @@ class TargetDataCleaner():
         self.identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
         self.identifier.set_languages(config['filter_langs'].append(self.lang))
         self.dic = pyphen.Pyphen(lang='de_DE', left=1, right=1)
+        self.tokenizer = get_tokenizer(config.get('tokenizer', 'nltk'))
+        self.transliteration = TransliterationTable(self.charset)
+        self.deduplicator = deduplicator
 
 
     def remove_chars(self, text):
@@ -75,10 +411,9 @@ class TargetDataCleaner():
             str: the string with normalized character range.
         """
 
-        exceptions = set(c for c in self.charset if len(c.encode()) > 1)
-        text = ''.join([unidecode(char) if len(char.encode()) > 1
-            and char not in exceptions else char for char in text])
-        return text
+        if text.isascii():
+            return text
+        return text.translate(self.transliteration)
 
 
     def word_tokenize(self, text):
@@ -92,7 +427,7 @@ class TargetDataCleaner():
             str: the tokenized string.
         """
 
-        text = word_tokenize(text)
+        text = self.tokenizer(text)
         return ' '.join(text)
 
 
@@ -149,6 +484,21 @@ class TargetDataCleaner():
         text = self.restrict_charset(text)
         text = self.word_tokenize(text)
         text = re.sub(r' +', ' ', text)
+        return self.copy(text)
+
+
+    def copy(self, text):
+        """
+        Copy a preprocessed string self.n_copies times,
+        optionally with a potential n-to-m mapping in each copy.
+
+        Args:
+            text (str): a preprocessed string.
+
+        Returns:
+            list: the copies of the string.
+        """
+
         texts = []
         for _ in range(self.n_copies):
             if self.n_to_m:
@@ -158,9 +508,39 @@ class TargetDataCleaner():
         return texts
 
 
+    def clean(self, text):
+        """
+        Clean a line of the corpus: skip it if it is a duplicate,
+        normalize punctuation and character set, check if the line is trash
+        and preprocess it otherwise.
+        The checks run before the tokenization and the copies.
+
+        Args:
+            text (str): a string.
+
+        Returns:
+            list: the preprocessed copies of the string, empty if trash,
+                or None if the string is a duplicate.
+        """
+
+        if self.deduplicator is not None \
+                and self.deduplicator.is_duplicate(text):
+            return None
+        text = self.remove_chars(text)
+        text = self.restrict_charset(text)
+        if self.is_trash(text):
+            return []
+        text = self.word_tokenize(text)
+        text = re.sub(r' +', ' ', text)
+        return self.copy(text)
+
+
     def is_trash(self, text):
         """
         Check if a string is trash based on heuristics:
+        too short, too many uppercase letters, digits or non-ASCII characters,
+        special characters, or another language.
+        The cheap checks run before the language identification.
 
         Args:
             text (str): a string.
@@ -171,17 +551,24 @@ class TargetDataCleaner():
 
         if len(text) < 5:
             return True
-        if sum(char.isupper() for char in text) > len(text)/5:
-            return True
-        if sum(char.isdigit() for char in text) > len(text)/4:
+        if '^' in text or 'http' in text or '@' in text:
             return True
-        if sum(len(char.encode()) > 1 for char in text) > len(text)/5:
+        # count uppercase letters, digits and non-ASCII characters in one pass
+        num_upper = 0
+        num_digits = 0
+        num_non_ascii = 0
+        for char in text:
+            if char.isupper():
+                num_upper += 1
+            elif char.isdigit():
+                num_digits += 1
+            if char > '\x7f':
+                num_non_ascii += 1
+        if num_upper > len(text)/5:
             return True
-        if '^' in text:
+        if num_digits > len(text)/4:
             return True
-        if 'http' in text:
-            return True
-        if '@' in text:
+        if num_non_ascii > len(text)/5:
             return True
         lid = self.identifier.classify(text)
         if lid[0] == 1 and lid[0] != self.lang:
@@ -189,26 +576,112 @@ class TargetDataCleaner():
         return False
 
 
+def _clean_chunk(cleaner, lines):
+    """
+    Clean a chunk of lines in a worker process, where None marks a duplicate.
+    """
+
+    return [None if line is None else cleaner.clean(line.strip())
+            for line in lines]
+
+
+def clean_parallel(config, infile, workers, chunk_size, deduplicator=None):
+    """
+    Clean the lines of a file in chunks with several worker processes.
+    The duplicates are removed in the calling process before the lines
+    are sent to the workers.
+
+    Args:
+        config (dict): the configuration of the data cleaner.
+        infile: an open text file.
+        workers (int): the number of worker processes.
+        chunk_size (int): the number of lines per chunk.
+        deduplicator (Deduplicator): the removal of repeated lines,
+            or None if they are kept.
+
+    Yields:
+        list: the preprocessed copies of each line (empty if trash),
+            in the order of the input lines, or None for each duplicate.
+    """
+
+    lines = infile
+    if deduplicator is not None:
+        lines = (None if deduplicator.is_duplicate(line.strip()) else line
+                 for line in infile)
+    for cleaned in parallel_map(_clean_chunk, read_chunks(lines, chunk_size),
+                                workers, TargetDataCleaner, (config,)):
+        yield from cleaned
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Clean the target corpus.')
+    parser.add_argument('infile', help='The raw target corpus.')
+    parser.add_argument('outfile', help='File to which the cleaned corpus '
+                        'is written.')
+    parser.add_argument('config', help='JSON configuration file.')
+    parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                        help='Word tokenizer (default: nltk).')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of worker processes (default: 1).')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Number of lines per chunk of a worker '
+                        '(default: 1000).')
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default=None,
+                        help='Removal of exact duplicates: a set of 64-bit '
+                        'fingerprints, a Bloom filter with bounded memory, '
+                        'or none (default: exact).')
+    parser.add_argument('--bloom-capacity', type=int, default=None,
+                        help='Expected number of lines of the Bloom filter '
+                        '(default: 10000000).')
+    parser.add_argument('--bloom-error-rate', type=float, default=None,
+                        help='False positive rate of the Bloom filter at full '
+                        'capacity (default: 0.001).')
+    parser.add_argument('--near-dedup-threshold', type=float, default=None,
+                        help='Remove lines whose word trigrams have at least '
+                        'this Jaccard similarity with a previous line, '
+                        'estimated with MinHash (default: off).')
+    return parser.parse_args()
+
+
 def main():
     """
     Read the configuration file, initialize a target data cleaner object
     and preprocess the target corpus.
     """
 
-    with open(sys.argv[3]) as configfile:
-        config = json.load(configfile)
+    args = parse_args()
 
-    data_cleaner = TargetDataCleaner(config)
+    with open(args.config) as configfile:
+        config = json.load(configfile)
+    if args.tokenizer is not None:
+        config['tokenizer'] = args.tokenizer
+    for key in ('dedup', 'bloom_capacity', 'bloom_error_rate',
+                'near_dedup_threshold'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    deduplicator = get_deduplicator(config)
 
     num_sents = 0
     num_del = 0
 
-    with open(sys.argv[1]) as infile, open(sys.argv[2], 'w') as outfile:
+    with open(args.infile) as infile, open(args.outfile, 'w') as outfile:
         print('Prepare target corpus ...')
-        for line in infile:
+        if args.workers > 1:
+            cleaned = clean_parallel(config, infile, args.workers,
+                                     args.chunk_size, deduplicator)
+        else:
+            data_cleaner = TargetDataCleaner(config, deduplicator)
+            cleaned = (data_cleaner.clean(line.strip()) for line in infile)
+        for texts in cleaned:
             num_sents += 1
-            texts = data_cleaner.preprocess(line.strip())
-            if data_cleaner.is_trash(texts[0]):
+            if texts is None:
+                # a duplicate, counted by the deduplicator
+                pass
+            elif not texts:
                 num_del +=1
             else:
                 for text in texts:
@@ -217,6 +690,11 @@ def main():
                 print(f'Processed {num_sents} sentences.\r', end='')
     print(f'Processed {num_sents} sentences.')
     print(f'Done. Deleted {num_del} sentences.')
+    if deduplicator is not None:
+        removed = deduplicator.removed
+        print(f'Removed {removed["exact"]} exact duplicates (fingerprints), '
+              f'{removed["bloom"]} exact duplicates (Bloom filter) and '
+              f'{removed["near"]} near duplicates (MinHash).')
 
 
 if __name__ == '__main__':
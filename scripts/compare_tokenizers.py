@@ -0,0 +1,61 @@
+"""
+Compare the fast tokenizer with NLTK's word_tokenize on a reference corpus
+and report every line on which they disagree.
+
+With --preserve-line, every line is tokenized as a single sentence, which
+compares the treebank rules without punkt's sentence boundaries (and does
+not need the punkt models).
+
+Usage: python3 scripts/compare_tokenizers.py REFERENCE_FILE [--lowercase]
+           [--preserve-line]
+"""
+
+import argparse
+import sys
+
+from word_tokenizer import fast_word_tokenize, nltk_word_tokenize
+
+
+def main():
+    """
+    Tokenize every line of the reference corpus with both tokenizers
+    and print the disagreements and the agreement rate.
+    """
+
+    parser = argparse.ArgumentParser(description='Compare the fast tokenizer '
+                                     'with NLTK on a reference corpus.')
+    parser.add_argument('reference', help='A text file with one sentence '
+                        'per line.')
+    parser.add_argument('--lowercase', action='store_true',
+                        help='Lowercase the lines first, as the normalizer does.')
+    parser.add_argument('--preserve-line', action='store_true',
+                        help='Tokenize every line as a single sentence.')
+    parser.add_argument('--max-report', type=int, default=100,
+                        help='Maximum number of disagreements to print.')
+    args = parser.parse_args()
+
+    num_lines = 0
+    num_diff = 0
+    with open(args.reference) as infile:
+        for line in infile:
+            line = line.strip()
+            if args.lowercase:
+                line = line.lower()
+            num_lines += 1
+            expected = nltk_word_tokenize(line, args.preserve_line)
+            tokens = fast_word_tokenize(line, args.preserve_line)
+            if tokens != expected:
+                num_diff += 1
+                if num_diff <= args.max_report:
+                    print(f'Line {num_lines}: {line}\n'
+                          f'  nltk: {" ".join(expected)}\n'
+                          f'  fast: {" ".join(tokens)}')
+
+    agreement = 1 - num_diff / num_lines if num_lines else 1
+    print(f'{num_diff} of {num_lines} lines differ '
+          f'({agreement:.2%} agreement).')
+    sys.exit(1 if num_diff else 0)
+
+
+if __name__ == '__main__':
+    main()
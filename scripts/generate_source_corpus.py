@@ -3,13 +3,22 @@ Generate the source-side corpus based on a target-side corpus
 by applying random substring substitutions.
 """
 
+import argparse
+from functools import lru_cache, partial
 import random
 import re
-import sys
 
 import json
 import pyphen
 
+from parallel import parallel_map, read_chunks
+
+REPEATED_CHARS = re.compile(r'(.)\1+')
+DOUBLE_CHARS = re.compile(r'(.)\1(.)\2')
+
+# Maximum number of word types whose hyphenation is memoized.
+HYPHENATION_CACHE_SIZE = 1 << 18
+
 
 class SourceDataPreparer():
     """
@@ -17,19 +26,56 @@ class SourceDataPreparer():
 
     Args:
         config (str): path to a JSON configuration file.
+        seed (int): seed of the random number generator
+            (default: seeded from the system).
 
     Attributes:
         replacements (dict): dictionary with target-to-source replacements.
         n_to_m (bool): option to activate n-to-m mapping.
         vowels (str): a list of vowels.
         consonants (str): a list of consonants.
+        ambisyllabic (bool): option to apply the ambisyllabic rules
+            (default: False).
+        random: the random number generator.
+        patterns (list): the compiled pattern of each grapheme class
+            and the function which replaces its matches.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, seed=None):
         self.replacements = config['replacements']
         self.n_to_m = config['n_to_m']
         self.vowels = config['vowels']
         self.consonants = config['consonants']
+        self.random = random.Random(seed)
+        self.n_to_m_hyphen = re.compile(
+            rf'(?=[{self.consonants}{self.vowels}])- ')
+        self.patterns = [
+            (re.compile(rf'(?<=[ ·])({self._get_keys("onset")})'
+                        rf'(?=[{self.vowels}])'),
+             lambda x: self.modify(x.group(1), 'onset')),
+            (re.compile(rf'(?<=[{self.vowels}])({self._get_keys("coda")})'
+                        rf'(?=[ ·])'),
+             lambda x: self.modify(x.group(1), 'coda')),
+            (re.compile(rf'(?<=[ ·{self.consonants}])'
+                        rf'({self._get_keys("nucleus")})'),
+             lambda x: self.modify(x.group(1), 'nucleus')),
+            (re.compile(rf'(?<=[ ·])([{self.consonants}]?)'
+                        rf'({self._get_keys("syllable")})(?=[ ·])'),
+             lambda x: x.group(1) + self.modify(x.group(2), 'syllable')),
+            (re.compile(rf'(?<=[{self.consonants}{self.vowels}·])'
+                        rf'({self._get_keys("final")})(?= )'),
+             lambda x: self.modify(x.group(1), 'final')),
+        ]
+        # The ambisyllabic rules have never been applied: their pattern
+        # was a plain string which could not match. They are opt-in, since
+        # applying them changes the corpus generated for a given seed.
+        self.ambisyllabic = config.get('ambisyllabic', False)
+        if self.ambisyllabic:
+            self.patterns.append(
+                (re.compile(rf'(?<=[{self.vowels}])'
+                            rf'({self._get_keys("ambisyllabic")})'
+                            rf'(?=[{self.vowels} ])'),
+                 lambda x: self.modify(x.group(1), 'ambisyllabic')))
 
 
     def _select(self, lst):
@@ -43,7 +89,7 @@ class SourceDataPreparer():
             str: the selected item from the list.
         """
 
-        return lst[random.randint(0, len(lst)-1)]
+        return lst[self.random.randint(0, len(lst)-1)]
 
 
     def _get_keys(self, position):
@@ -73,7 +119,7 @@ class SourceDataPreparer():
             A randomly modified version of the input string.
         """
 
-        if random.random() > 0.84 and self.replacements[grapheme_type][grapheme] != []:
+        if self.random.random() > 0.84 and self.replacements[grapheme_type][grapheme] != []:
             grapheme = self._select(self.replacements[grapheme_type][grapheme])
         return grapheme
 
@@ -91,40 +137,19 @@ class SourceDataPreparer():
 
         if self.n_to_m:
             text = text.replace('_', '')
-            text = re.sub(rf'(?=[{self.consonants}{self.vowels}])- ', ' ', text)
+            text = self.n_to_m_hyphen.sub(' ', text)
         tokens = text.split(' ')
         source = []
         for token_orig in tokens:
             token = f' {token_orig} '
-            mod = re.sub(rf'(?<=[ ·])({self._get_keys("onset")})(?=[{self.vowels}])',
-                         lambda x: self.modify(x.group(1), 'onset'), token)
-            if mod != '':
-                token = mod
-            mod = re.sub(rf'(?<=[{self.vowels}])({self._get_keys("coda")})(?=[ ·])',
-                         lambda x: self.modify(x.group(1), 'coda'), token)
-            if mod != '':
-                token = mod
-            mod = re.sub(rf'(?<=[ ·{self.consonants}])({self._get_keys("nucleus")})',
-                         lambda x: self.modify(x.group(1), 'nucleus'), token)
-            if mod != '':
-                token = mod
-            mod = re.sub(rf'(?<=[ ·])([{self.consonants}]?)({self._get_keys("syllable")})(?=[ ·])',
-                         lambda x: x.group(1) + self.modify(x.group(2), 'syllable'), token)
-            if mod != '':
-                token = mod
-            mod = re.sub(rf'(?<=[{self.consonants}{self.vowels}·])({self._get_keys("final")})(?= )',
-                         lambda x: self.modify(x.group(1), 'final'), token)
-            if mod != '':
-                token = mod
-            mod = re.sub(rf'(?<=[{self.vowels}])'\
-                         '({self._get_keys("ambisyllabic")})(?=[{self.vowels} ])',
-                         lambda x: self.modify(x.group(1), 'ambisyllabic'), token)
-            if mod != '':
-                token = mod
-            token = re.sub(r'·', '', token)
-            token = re.sub(r'(.)\1+', r'\1\1', token)
-            if random.random() > 0.5:
-                token = re.sub(r'(.)\1(.)\2', r'\1\2\2', token)
+            for pattern, replace in self.patterns:
+                mod = pattern.sub(replace, token)
+                if mod != '':
+                    token = mod
+            token = token.replace('·', '')
+            token = REPEATED_CHARS.sub(r'\1\1', token)
+            if self.random.random() > 0.5:
+                token = DOUBLE_CHARS.sub(r'\1\2\2', token)
             token = token.lower().strip()
             if token != '':
                 source.append(token)
@@ -133,35 +158,143 @@ class SourceDataPreparer():
         return re.sub(r' +', ' ', ' '.join(source))
 
 
+def get_hyphenator(config):
+    """
+    Create a memoized function which inserts '·' at the syllable boundaries
+    of a word.
+
+    Args:
+        config (dict): the configuration with the language code "lang".
+
+    Returns:
+        function: the hyphenation function.
+    """
+
+    dic = pyphen.Pyphen(lang=f'{config["lang"]}_{config["lang"].upper()}',
+                        left=1, right=1)
+    return lru_cache(maxsize=HYPHENATION_CACHE_SIZE)(
+        partial(dic.inserted, hyphen='·'))
+
+
+def generate_chunk(hyphenate, data_preparer, lines, seed=None):
+    """
+    Generate the source-side lines of a chunk of target-side lines.
+
+    Args:
+        hyphenate: the hyphenation function.
+        data_preparer (SourceDataPreparer): the source-data generator.
+        lines (list): the target-side lines.
+        seed (str): optional seed of the random number generator
+            for this chunk.
+
+    Returns:
+        list: the source-side lines.
+    """
+
+    if seed is not None:
+        data_preparer.random.seed(seed)
+    source = []
+    for line in lines:
+        line = ' '.join(hyphenate(token) for token in line.strip().split())
+        source.append(data_preparer.process(line.lower().strip()))
+    return source
+
+
+def chunk_seed(seed, index):
+    """
+    Derive the seed of a chunk from the seed of the run,
+    or None if the run is not seeded.
+    """
+
+    return None if seed is None else f'{seed}:{index}'
+
+
+def _init_worker(config):
+    """
+    Create the hyphenation function and the source-data generator
+    of a worker process.
+    """
+
+    return get_hyphenator(config), SourceDataPreparer(config)
+
+
+def _generate_chunk(worker, chunk):
+    """
+    Generate the source-side lines of a chunk of (lines, seed)
+    in a worker process.
+    """
+
+    lines, seed = chunk
+    return generate_chunk(*worker, lines, seed)
+
+
+def generate_parallel(config, infile, workers, chunk_size, seed=None):
+    """
+    Generate the source-side lines of a file in chunks with several worker
+    processes.
+
+    Yields:
+        list: the source-side lines of each chunk, in the original order.
+    """
+
+    chunks = ((chunk, chunk_seed(seed, index)) for index, chunk
+              in enumerate(read_chunks(infile, chunk_size)))
+    yield from parallel_map(_generate_chunk, chunks, workers,
+                            _init_worker, (config,))
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Generate the source-side '
+                                     'corpus from the target-side corpus.')
+    parser.add_argument('infile', help='The target-side corpus.')
+    parser.add_argument('outfile', help='File to which the source-side '
+                        'corpus is written.')
+    parser.add_argument('config', help='JSON configuration file.')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of worker processes (default: 1).')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed. With a seed, the output is the '
+                        'same for any number of workers.')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Number of lines per chunk, each with its own '
+                        'random number generator derived from the seed '
+                        '(default: 1000).')
+    return parser.parse_args()
+
+
 def main():
     """
     Read the configuration file, initialize a source-data generator
     and generate a source-side corpus by applying random substring substitutions.
     """
 
-    with open(sys.argv[3]) as configfile:
-        config = json.load(configfile)
-
-    dic = pyphen.Pyphen(lang=f'{config["lang"]}_{config["lang"].upper()}',
-                        left=1, right=1)
+    args = parse_args()
 
-    data_preparer = SourceDataPreparer(config)
+    with open(args.config) as configfile:
+        config = json.load(configfile)
 
     num_sents = 0
 
-    with open(sys.argv[1]) as infile, open(sys.argv[2], 'w') as outfile:
+    with open(args.infile) as infile, open(args.outfile, 'w') as outfile:
         print('Prepare source corpus ...')
-        for line in infile:
-            num_sents += 1
-            segmented = []
-            tokens = line.strip().split()
-            for token in tokens:
-                segmented.append(dic.inserted(token, hyphen='·'))
-            line = ' '.join(segmented)
-            line = data_preparer.process(line.lower().strip())
-            outfile.write(line + '\n')
-            if num_sents % 1000 == 0:
-                print(f'Processed {num_sents} sentences.\r', end='')
+        if args.workers > 1:
+            chunks = generate_parallel(config, infile, args.workers,
+                                       args.chunk_size, args.seed)
+        else:
+            hyphenate = get_hyphenator(config)
+            data_preparer = SourceDataPreparer(config)
+            chunks = (generate_chunk(hyphenate, data_preparer, chunk,
+                                     chunk_seed(args.seed, index))
+                      for index, chunk
+                      in enumerate(read_chunks(infile, args.chunk_size)))
+        for lines in chunks:
+            outfile.write(''.join(line + '\n' for line in lines))
+            num_sents += len(lines)
+            print(f'Processed {num_sents} sentences.\r', end='')
     print(f'Processed {num_sents} sentences.')
     print('Done.')
 
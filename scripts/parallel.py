@@ -0,0 +1,87 @@
+"""
+Ordered parallel processing of a corpus in chunks, shared by the corpus
+preparation scripts.
+
+The chunks are processed by a pool of worker processes and the results are
+yielded in the order of the chunks. At most two chunks per worker are
+submitted at a time, so the memory does not grow with the size of the corpus.
+An optional initializer creates a state once per worker, e.g. a data cleaner
+whose construction is expensive.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+_STATE = None
+
+
+def read_chunks(lines, chunk_size):
+    """
+    Read lines (or tuples of parallel lines) in chunks of consecutive items.
+
+    Args:
+        lines: an iterable, e.g. an open file.
+        chunk_size (int): the number of items per chunk.
+
+    Yields:
+        list: the next chunk.
+    """
+
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def _init_worker(initializer, initargs):
+    """
+    Create the state of a worker process.
+    """
+
+    global _STATE
+    _STATE = initializer(*initargs)
+
+
+def _process(function, chunk, stateful):
+    """
+    Process a chunk in a worker process.
+    """
+
+    if stateful:
+        return function(_STATE, chunk)
+    return function(chunk)
+
+
+def parallel_map(function, chunks, workers, initializer=None, initargs=()):
+    """
+    Apply a function to chunks with several worker processes.
+
+    Args:
+        function: a picklable function, called as function(chunk), or as
+            function(state, chunk) if an initializer is given.
+        chunks: an iterable of chunks.
+        workers (int): the number of worker processes.
+        initializer: optional function which creates the state of a worker.
+        initargs (tuple): the arguments of the initializer.
+
+    Yields:
+        the result of each chunk, in the order of the chunks.
+    """
+
+    stateful = initializer is not None
+    options = {}
+    if stateful:
+        options = {'initializer': _init_worker,
+                   'initargs': (initializer, initargs)}
+    with ProcessPoolExecutor(max_workers=workers, **options) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_process, function, chunk,
+                                           stateful))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
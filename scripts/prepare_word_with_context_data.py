@@ -2,19 +2,118 @@
 Prepare the training corpus for a word-with-context model.
 Create a sample for each token, with a 10-token context window
 on the source side.
+
+The windows are built by context_windows, which the normalizer also uses
+to build the input of the fallback model.
 """
 
+import argparse
+import os
 import sys
+from functools import partial
+
+# the normalizer imports this module as scripts.prepare_word_with_context_data
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from parallel import parallel_map, read_chunks  # noqa: E402
+
+PAD = '<pad>'
+
+
+def context_windows(tokens, context=5, positions=None):
+    """
+    Generate the context windows of the tokens of a sentence:
+    the token marked by <token> tags, with the given number of tokens
+    (padded with <pad>) on either side.
+
+    Args:
+        tokens (list): the tokens of the sentence.
+        context (int): the number of context tokens on either side.
+        positions (list): optional positions of the tokens whose windows
+            are generated (default: all tokens).
+
+    Yields:
+        str: the window of each token.
+    """
+
+    padded = [PAD] * context + tokens + [PAD] * context
+    if positions is None:
+        positions = range(len(tokens))
+    for position in positions:
+        end = position + context
+        yield ' '.join(padded[position:end] + ['<token>', padded[end],
+                       '</token>'] + padded[end+1:end+context+1])
+
+
+def prepare_samples(lines, context=5):
+    """
+    Create the samples of a chunk of sentence pairs.
+
+    Args:
+        lines (list): pairs of source and target sentences.
+        context (int): the number of context tokens on either side.
+
+    Returns:
+        tuple: the source windows and the target tokens,
+            each as a string with one sample per line.
+    """
+
+    sources = []
+    targets = []
+    for line1, line2 in lines:
+        tokens = line1.split()
+        sources.extend(context_windows(tokens, context))
+        target_tokens = [PAD] * context + line2.split() + [PAD] * context
+        targets.extend(target_tokens[context + position]
+                       for position in range(len(tokens)))
+    return ''.join(source + '\n' for source in sources), \
+           ''.join(target + '\n' for target in targets)
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Prepare the training corpus '
+                                     'for a word-with-context model.')
+    parser.add_argument('src_in', help='The source-side corpus.')
+    parser.add_argument('tgt_in', help='The target-side corpus.')
+    parser.add_argument('src_out', help='File to which the source-side '
+                        'windows are written.')
+    parser.add_argument('tgt_out', help='File to which the target-side '
+                        'tokens are written.')
+    parser.add_argument('--context', type=int, default=5,
+                        help='Number of context tokens on either side '
+                        '(default: 5).')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of worker processes (default: 1).')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='Number of sentence pairs per chunk '
+                        '(default: 10000).')
+    return parser.parse_args()
+
+
+def main():
+    """
+    Create a sample for each token of the parallel corpus.
+    """
+
+    args = parse_args()
+
+    with open(args.src_in) as srcfile, open(args.tgt_in) as tgtfile,\
+         open(args.src_out, 'w', buffering=1<<20) as src_out,\
+         open(args.tgt_out, 'w', buffering=1<<20) as tgt_out:
+        chunks = read_chunks(zip(srcfile, tgtfile), args.chunk_size)
+        if args.workers > 1:
+            samples = parallel_map(partial(prepare_samples,
+                                           context=args.context),
+                                   chunks, args.workers)
+        else:
+            samples = (prepare_samples(chunk, args.context) for chunk in chunks)
+        for sources, targets in samples:
+            src_out.write(sources)
+            tgt_out.write(targets)
+
 
-with open(sys.argv[1]) as srcfile, open(sys.argv[2]) as tgtfile,\
-     open(sys.argv[3], 'w') as src_out, open(sys.argv[4], 'w') as tgt_out:
-    for line1, line2 in zip(srcfile, tgtfile):
-        line1 = ['<pad>']*5 + line1.split() + ['<pad>']*5
-        line2 = ['<pad>']*5 + line2.split() + ['<pad>']*5
-        for i in range(len(line1)-10):
-            sample = line1.copy()
-            sample_target = line2[i+5]
-            sample[i+5] = f'<token> {sample[i+5]} </token>'
-            sample = sample[i:i+11]
-            src_out.write(' '.join(sample)+'\n')
-            tgt_out.write(sample_target+'\n')
+if __name__ == '__main__':
+    main()
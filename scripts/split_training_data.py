@@ -1,46 +1,215 @@
 """
 Split the full corpus into a training set, a validation set and a test set.
+
+Each sentence pair is assigned to a set by a keyed hash of the pair, so the
+split is the same on every run with the same seed, and repeated pairs
+(e.g. copies of a sentence) always end up in the same set.
+The training set is shuffled out of core: the pairs are scattered into
+temporary buckets at random, and each bucket is shuffled in memory.
+The number of buckets is chosen such that a bucket fits into --max-memory,
+but at most MAX_BUCKETS files are open at once: a bucket which is still too
+large is scattered into buckets again in another pass.
+The validation and test sets keep the order of the corpus.
 """
 
-import sys
+import argparse
+import hashlib
+import os
 import random
+import tempfile
+
+BUFFER_SIZE = 1 << 20
+
+# Estimated memory used by the Python strings of a bucket per byte on disk.
+MEMORY_PER_BYTE = 3
+
+# Maximum number of buckets written at once.
+MAX_BUCKETS = 256
+
+
+def assign(line1, line2, key, valid, test):
+    """
+    Assign a sentence pair to a set.
+
+    Args:
+        line1 (str): the source sentence.
+        line2 (str): the target sentence.
+        key (bytes): the key of the hash.
+        valid (float): the share of the validation set.
+        test (float): the share of the test set.
+
+    Returns:
+        str: 'train', 'valid' or 'test'.
+    """
+
+    digest = hashlib.blake2b(f'{line1}\t{line2}'.encode(), digest_size=8,
+                             key=key).digest()
+    value = int.from_bytes(digest, 'big') / 2**64
+    if value < test:
+        return 'test'
+    if value < test + valid:
+        return 'valid'
+    return 'train'
+
+
+def count_buckets(size, max_memory):
+    """
+    Get the number of buckets into which pairs are scattered, such that
+    a bucket takes half of the available memory on average.
+
+    Args:
+        size (int): the size of the pairs in bytes.
+        max_memory (int): the available memory in bytes.
+
+    Returns:
+        int: the number of buckets, at most MAX_BUCKETS.
+    """
+
+    return max(1, min(MAX_BUCKETS, -(-2 * size * MEMORY_PER_BYTE // max_memory)))
+
+
+def open_buckets(directory, num_buckets):
+    """
+    Create the files of the buckets in a directory.
+
+    Returns:
+        list: the paths and the open files of the buckets.
+    """
+
+    paths = [os.path.join(directory, f'bucket{index}')
+             for index in range(num_buckets)]
+    # each bucket holds the pairs as two consecutive lines
+    buckets = [open(path, 'w', newline='\n',
+                    buffering=BUFFER_SIZE // num_buckets + 4096)
+               for path in paths]
+    return paths, buckets
+
+
+def read_pairs(path):
+    """
+    Read the pairs of a bucket.
+
+    Yields:
+        tuple: the source and target line of each pair.
+    """
+
+    with open(path, newline='\n', buffering=BUFFER_SIZE) as bucket:
+        for line1 in bucket:
+            yield line1, next(bucket)
+
+
+def write_shuffled(path, src_out, tgt_out, max_memory, rng, parent_size=None):
+    """
+    Shuffle the pairs of a bucket and write them to the training set.
+    A bucket which does not fit into memory is scattered into smaller
+    buckets, which are shuffled in turn. The bucket is removed afterwards.
+
+    Args:
+        path (str): the bucket.
+        src_out: the source-side training file.
+        tgt_out: the target-side training file.
+        max_memory (int): the available memory in bytes.
+        rng: the random number generator.
+        parent_size (int): the size of the bucket from which the bucket was
+            scattered, if any.
+    """
+
+    size = os.path.getsize(path)
+    # a bucket which is not smaller than its parent cannot be split further
+    if size * MEMORY_PER_BYTE > max_memory \
+            and (parent_size is None or size < parent_size):
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as tmpdir:
+            paths, buckets = open_buckets(tmpdir,
+                                          max(2, count_buckets(size, max_memory)))
+            for line1, line2 in read_pairs(path):
+                buckets[rng.randrange(len(buckets))].write(line1 + line2)
+            for bucket in buckets:
+                bucket.close()
+            os.remove(path)
+            for bucket_path in paths:
+                write_shuffled(bucket_path, src_out, tgt_out, max_memory, rng,
+                               size)
+        return
+
+    pairs = list(read_pairs(path))
+    os.remove(path)
+    rng.shuffle(pairs)
+    src_out.write(''.join(line1 for line1, _ in pairs))
+    tgt_out.write(''.join(line2 for _, line2 in pairs))
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Split the full corpus into '
+                                     'a training, a validation and a test set.')
+    parser.add_argument('src_corpus', help='The source-side corpus.')
+    parser.add_argument('tgt_corpus', help='The target-side corpus.')
+    parser.add_argument('outdir', help='Directory for the sets.')
+    parser.add_argument('src', help='Suffix of the source-side files.')
+    parser.add_argument('tgt', help='Suffix of the target-side files.')
+    parser.add_argument('--valid', type=float, default=0.08,
+                        help='Share of the validation set (default: 0.08).')
+    parser.add_argument('--test', type=float, default=0.001,
+                        help='Share of the test set (default: 0.001).')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed of the split and the shuffle (default: 1).')
+    parser.add_argument('--max-memory', type=int, default=1024,
+                        help='Approximate memory in MB for shuffling the '
+                        'training set (default: 1024).')
+    args = parser.parse_args()
+    if args.max_memory <= 0:
+        parser.error('--max-memory must be positive.')
+    return args
+
+
+def main():
+    """
+    Split the corpus and shuffle the training set.
+    """
+
+    args = parse_args()
+    key = str(args.seed).encode()
+    rng = random.Random(args.seed)
+
+    max_memory = args.max_memory * 2**20
+    corpus_size = os.path.getsize(args.src_corpus) \
+                  + os.path.getsize(args.tgt_corpus)
+
+    outfiles = {}
+    for name in ('train', 'valid', 'test'):
+        outfiles[name] = [open(f'{args.outdir}/{name}.{suffix}', 'w',
+                               buffering=BUFFER_SIZE)
+                          for suffix in (args.src, args.tgt)]
+
+    with tempfile.TemporaryDirectory(dir=args.outdir) as tmpdir:
+        paths, buckets = open_buckets(tmpdir,
+                                      count_buckets(corpus_size, max_memory))
+        num_buckets = len(buckets)
+        with open(args.src_corpus) as file1, open(args.tgt_corpus) as file2:
+            for line1, line2 in zip(file1, file2):
+                line1 = line1.rstrip('\n') + '\n'
+                line2 = line2.rstrip('\n') + '\n'
+                name = assign(line1, line2, key, args.valid, args.test)
+                if name == 'train':
+                    buckets[rng.randrange(num_buckets)].write(line1 + line2)
+                else:
+                    src_out, tgt_out = outfiles[name]
+                    src_out.write(line1)
+                    tgt_out.write(line2)
+
+        for bucket in buckets:
+            bucket.close()
+        src_train, tgt_train = outfiles['train']
+        for path in paths:
+            write_shuffled(path, src_train, tgt_train, max_memory, rng)
+
+    for files in outfiles.values():
+        for outfile in files:
+            outfile.close()
+
 
-outdir = sys.argv[3]
-src = sys.argv[4]
-tgt = sys.argv[5]
-
-corpus = []
-
-with open(sys.argv[1]) as file1, open(sys.argv[2]) as file2:
-    for sample in zip(file1, file2):
-        corpus.append(sample)
-
-random.shuffle(corpus)
-
-n_valid = 0.08 * len(corpus)
-n_test = 0.001 * len(corpus)
-
-src_test = open(f'{outdir}/test.{src}', 'w')
-tgt_test = open(f'{outdir}/test.{tgt}', 'w')
-src_valid = open(f'{outdir}/valid.{src}', 'w')
-tgt_valid = open(f'{outdir}/valid.{tgt}', 'w')
-src_train = open(f'{outdir}/train.{src}', 'w')
-tgt_train = open(f'{outdir}/train.{tgt}', 'w')
-
-for index, (line1, line2) in enumerate(corpus):
-    if index < n_test:
-        src_test.write(line1)
-        tgt_test.write(line2)
-    elif index < n_test + n_valid:
-        src_valid.write(line1)
-        tgt_valid.write(line2)
-    else:
-        src_train.write(line1)
-        tgt_train.write(line2)
-
-src_test.close()
-tgt_test.close()
-src_valid.close()
-tgt_valid.close()
-src_train.close()
-tgt_train.close()
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,116 @@
 """
 Learn a sentencepiece model and apply it to all partitions of the training set.
+
+The partitions are encoded in parallel, one process per file, and the lines
+of a file are encoded in batches.
 """
 
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 import sentencepiece as spm
 
-source = sys.argv[1]
-target = sys.argv[2]
-outdir = sys.argv[3]
-training_file = sys.argv[4]
-word_with_context = sys.argv[5]
-
-if word_with_context:
-    spm.SentencePieceTrainer.train(input=f'{outdir}/{training_file}',
-                                   model_prefix='subword',
-                                   vocab_size=1000,
-                                   user_defined_symbols=['<token>', '</token>', '<pad>'])
-else:
-    spm.SentencePieceTrainer.train(input=f'{outdir}/{training_file}',
-                                   model_prefix='subword',
-                                   vocab_size=1000)
-
-sp = spm.SentencePieceProcessor(model_file='subword.model')
-
-partitions = ['train', 'valid', 'test']
-langs = [source, target]
-
-for partition in partitions:
-    for lang in langs:
-        with open(f'{outdir}/{partition}.{lang}') as infile, \
-            open(f'{outdir}/{partition}.sub.{lang}', 'w') as outfile:
-            for line in infile:
-                outfile.write(' '.join(sp.encode(line, out_type=str))+'\n')
+BUFFER_SIZE = 1 << 20
+
+
+def encode_file(model_file, infile_path, outfile_path, batch_size=10000):
+    """
+    Encode a file with a sentencepiece model.
+
+    Args:
+        model_file (str): the sentencepiece model.
+        infile_path (str): the file to encode.
+        outfile_path (str): the file to which the subwords are written.
+        batch_size (int): the number of lines encoded at once.
+
+    Returns:
+        int: the number of encoded lines.
+    """
+
+    sp = spm.SentencePieceProcessor(model_file=model_file)
+    num_lines = 0
+    with open(infile_path) as infile, \
+            open(outfile_path, 'w', buffering=BUFFER_SIZE) as outfile:
+        while True:
+            lines = list(islice(infile, batch_size))
+            if not lines:
+                break
+            pieces = sp.encode(lines, out_type=str)
+            outfile.write(''.join(' '.join(line_pieces) + '\n'
+                                  for line_pieces in pieces))
+            num_lines += len(lines)
+    return num_lines
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Learn a sentencepiece model '
+                                     'and apply it to all partitions.')
+    parser.add_argument('source', help='Suffix of the source-side files.')
+    parser.add_argument('target', help='Suffix of the target-side files.')
+    parser.add_argument('outdir', help='Directory of the partitions.')
+    parser.add_argument('training_file', help='File in outdir on which the '
+                        'sentencepiece model is trained.')
+    parser.add_argument('word_with_context', nargs='?', default='',
+                        help='Add the symbols of the word-with-context model '
+                        'to the vocabulary if not empty.')
+    parser.add_argument('--workers', '-w', type=int, default=6,
+                        help='Number of worker processes (default: 6).')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='Number of lines encoded at once '
+                        '(default: 10000).')
+    parser.add_argument('--input-sentence-size', type=int, default=0,
+                        help='Train the sentencepiece model on a random '
+                        'sample of this many lines (default: all lines).')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Encode with this sentencepiece model instead of '
+                        'learning a new one.')
+    parser.add_argument('--files', nargs='*', default=None,
+                        help='Names of the files in outdir to encode, e.g. '
+                        'train.fnhd (default: all partitions of both '
+                        'languages, none to only learn the model).')
+    return parser.parse_args()
+
+
+def main():
+    """
+    Learn the sentencepiece model and encode the partitions.
+    """
+
+    args = parse_args()
+
+    model_file = args.model
+    if model_file is None:
+        options = {}
+        if args.word_with_context:
+            options['user_defined_symbols'] = ['<token>', '</token>', '<pad>']
+        if args.input_sentence_size:
+            options['input_sentence_size'] = args.input_sentence_size
+            options['shuffle_input_sentence'] = True
+        spm.SentencePieceTrainer.train(
+            input=f'{args.outdir}/{args.training_file}',
+            model_prefix='subword', vocab_size=1000, **options)
+        model_file = 'subword.model'
+
+    files = args.files
+    if files is None:
+        files = [f'{partition}.{lang}' for partition in ['train', 'valid', 'test']
+                 for lang in [args.source, args.target]]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = []
+        for name in files:
+            partition, lang = name.split('.', 1)
+            futures.append(executor.submit(
+                encode_file, model_file, f'{args.outdir}/{name}',
+                f'{args.outdir}/{partition}.sub.{lang}', args.batch_size))
+        for future in futures:
+            future.result()
+
+
+if __name__ == '__main__':
+    main()
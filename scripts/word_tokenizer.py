@@ -0,0 +1,198 @@
+"""
+Word tokenizers shared by the normalizer and the corpus preparation scripts.
+
+Two tokenizers are available:
+- nltk: NLTK's word_tokenize (requires the punkt models)
+- fast: a port of the treebank rules of NLTK's word tokenizer (NLTK 3.10,
+    the version pinned in requirements.txt) with an approximation of punkt's
+    sentence boundaries, which only matter for sentence-final periods.
+
+Both tokenizers return a list of tokens. The fast tokenizer is not guaranteed
+to agree with NLTK on every input; use scripts/compare_tokenizers.py to list
+the disagreements on a reference corpus.
+"""
+
+import re
+
+TOKENIZER_NAMES = ('nltk', 'fast')
+
+_nltk_word_tokenize = None
+
+
+def nltk_word_tokenize(text, preserve_line=False):
+    """
+    Tokenize a string with NLTK's word_tokenize (imported on first use).
+
+    Args:
+        text (str): a string.
+        preserve_line (bool): tokenize the string as a single sentence.
+
+    Returns:
+        list: the tokens.
+    """
+
+    global _nltk_word_tokenize
+    if _nltk_word_tokenize is None:
+        from nltk.tokenize import word_tokenize
+        _nltk_word_tokenize = word_tokenize
+    return _nltk_word_tokenize(text, preserve_line=preserve_line)
+
+
+# Sentence boundaries: a whitespace-separated chunk ending with a period
+# (optionally followed by closing brackets or quotes), ? or !.
+_SENTENCE_END = re.compile(r'(?:(?:^|[^.])\.|[?!])[\]\)}>"\'»”’“]*$')
+_CLOSING = '\'"»”’“)]}>'
+_NUMBER = re.compile(r'-?[\.,]?\d[\d,\.-]*$')
+_INITIAL = re.compile(r'[^\W\d]$')
+_PUNKT_PUNCTUATION = frozenset(';:,.!?')
+
+# The rules of NLTKWordTokenizer in NLTK 3.10 (see requirements.txt),
+# in the same order.
+_STARTING_QUOTES = [
+    (re.compile(r'([«“‘„]|[`]+)'), r' \1 '),
+    (re.compile(r'^"'), r'``'),
+    (re.compile(r'(``)'), r' \1 '),
+    (re.compile(r'([ \(\[{<])("|\'{2})'), r'\1 `` '),
+    (re.compile(r"(?i)(?<!\w)(')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r'\1 '),
+]
+
+_PUNCTUATION = [
+    (re.compile(r'([^\.])(\.)([\]\)}>"\'»”’ ]*)\s*$'), r'\1 \2 \3 '),
+    (re.compile(r'([:,])([^\d])'), r' \1 \2'),
+    (re.compile(r'([:,])$'), r' \1 '),
+    (re.compile(r'\.{2,}'), r' \g<0> '),
+    (re.compile(r'[;@#$%&]'), r' \g<0> '),
+    # figure dash, en dash, em dash and horizontal bar
+    (re.compile(r'[\u2012-\u2015]'), r' \g<0> '),
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r'\1 \2\3 '),
+    (re.compile(r'[?!]'), r' \g<0> '),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r'[*]'), r' \g<0> '),
+    (re.compile(r'[\]\[\(\)\{\}<>]'), r' \g<0> '),
+    (re.compile(r'--'), r' -- '),
+]
+
+_ENDING_QUOTES = [
+    (re.compile(r'([»”’])'), r' \1 '),
+    (re.compile(r"''"), r" '' "),
+    (re.compile(r'"'), r" '' "),
+    (re.compile(r'\s+'), r' '),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r'\1 \2 '),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r'\1 \2 '),
+]
+
+_CONTRACTION_HINT = re.compile(
+    r"(?i)cannot|d'ye|gimme|gonna|gotta|lemme|more'n|wanna|'tis|'twas")
+_CONTRACTIONS = [re.compile(pattern) for pattern in [
+    r'(?i)\b(can)(not)\b',
+    r"(?i)\b(d)('ye)\b",
+    r'(?i)\b(gim)(me)\b',
+    r'(?i)\b(gon)(na)\b',
+    r'(?i)\b(got)(ta)\b',
+    r'(?i)\b(lem)(me)\b',
+    r"(?i)\b(more)('n)\b",
+    r'(?i)\b(wan)(na)(?=\s)',
+    r"(?i) ('t)(is)\b",
+    r"(?i) ('t)(was)\b",
+]]
+
+
+def _is_sentence_break(chunk, next_chunk):
+    """
+    Approximate punkt's decision whether a sentence ends after a chunk
+    which ends with a period, a question mark or an exclamation mark.
+    Numbers and initials followed by a lowercase word (or punctuation)
+    do not end a sentence, an ellipsis never does.
+    """
+
+    chunk = chunk.rstrip(_CLOSING)
+    if chunk.endswith(('?', '!')):
+        return True
+    if chunk.endswith('..'):
+        return False
+    core = chunk[:-1]
+    if _NUMBER.match(core) or _INITIAL.match(core):
+        if next_chunk in _PUNKT_PUNCTUATION or next_chunk[0].islower():
+            return False
+        if _INITIAL.match(core) and next_chunk[0].isupper():
+            return False
+    return True
+
+
+def split_sentences(text):
+    """
+    Split a string into sentences, approximating punkt for the
+    purposes of word tokenization.
+
+    Args:
+        text (str): a string.
+
+    Returns:
+        list: the sentences.
+    """
+
+    chunks = text.split()
+    sentences = []
+    start = 0
+    for index, chunk in enumerate(chunks[:-1]):
+        if _SENTENCE_END.search(chunk) \
+                and _is_sentence_break(chunk, chunks[index+1]):
+            sentences.append(' '.join(chunks[start:index+1]))
+            start = index + 1
+    sentences.append(' '.join(chunks[start:]))
+    return sentences
+
+
+def _tokenize_sentence(text):
+    """
+    Tokenize a single sentence with the treebank rules.
+    """
+
+    for pattern, substitution in _STARTING_QUOTES:
+        text = pattern.sub(substitution, text)
+    for pattern, substitution in _PUNCTUATION:
+        text = pattern.sub(substitution, text)
+    text = f' {text} '
+    for pattern, substitution in _ENDING_QUOTES:
+        text = pattern.sub(substitution, text)
+    if _CONTRACTION_HINT.search(text):
+        for pattern in _CONTRACTIONS:
+            text = pattern.sub(r' \1 \2 ', text)
+    return text.split()
+
+
+def fast_word_tokenize(text, preserve_line=False):
+    """
+    Tokenize a string with the precompiled rules.
+
+    Args:
+        text (str): a string.
+        preserve_line (bool): tokenize the string as a single sentence.
+
+    Returns:
+        list: the tokens.
+    """
+
+    if preserve_line:
+        return _tokenize_sentence(text)
+    return [token for sentence in split_sentences(text)
+            for token in _tokenize_sentence(sentence)]
+
+
+def get_tokenizer(name):
+    """
+    Get a tokenizer function by its name.
+
+    Args:
+        name (str): 'nltk' or 'fast'.
+
+    Returns:
+        function: a function which maps a string to a list of tokens.
+    """
+
+    if name == 'nltk':
+        return nltk_word_tokenize
+    if name == 'fast':
+        return fast_word_tokenize
+    raise ValueError(f'Unknown tokenizer {name!r}, '
+                     f'choose one of {", ".join(TOKENIZER_NAMES)}.')
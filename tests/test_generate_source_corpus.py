@@ -0,0 +1,57 @@
+"""
+Golden test of the source corpus generation over data/test.fnhd.
+
+The golden file tests/golden/test.fnhd.source was generated by the original
+generate_source_corpus.py (before the patterns were compiled and the
+generator was seeded per chunk), with the global random number generator
+seeded with '1:0', the seed of the first chunk of a run with --seed 1.
+The test checks that the current generator produces the same corpus.
+It is skipped if pyphen is not installed.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+try:
+    import pyphen  # noqa: F401
+except ImportError:
+    pyphen = None
+
+TEST_FILE = os.path.join(ROOT, 'data', 'test.fnhd')
+GOLDEN_FILE = os.path.join(ROOT, 'tests', 'golden', 'test.fnhd.source')
+CONFIG_FILE = os.path.join(ROOT, 'data', 'config.json')
+
+
+@unittest.skipIf(pyphen is None, 'pyphen is not installed')
+class GenerateSourceCorpusGoldenTest(unittest.TestCase):
+    """
+    Compare the seeded source corpus with the output of the original script.
+    """
+
+    def test_golden(self):
+        from generate_source_corpus import (SourceDataPreparer, chunk_seed,
+                                            generate_chunk, get_hyphenator)
+
+        with open(CONFIG_FILE) as configfile:
+            config = json.load(configfile)
+        with open(TEST_FILE) as infile:
+            lines = infile.readlines()
+        with open(GOLDEN_FILE) as goldenfile:
+            golden = [line.rstrip('\n') for line in goldenfile]
+
+        source = generate_chunk(get_hyphenator(config),
+                                SourceDataPreparer(config), lines,
+                                chunk_seed(1, 0))
+        self.assertEqual(len(source), len(golden))
+        for number, (line, expected) in enumerate(zip(source, golden), 1):
+            with self.subTest(line=number):
+                self.assertEqual(line, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
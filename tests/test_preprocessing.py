@@ -0,0 +1,124 @@
+"""
+Golden test of the preprocessing and postprocessing of the normalizer
+over data/test.fnhd, with the model loading stubbed out.
+
+The golden file holds, for every line, the model input and the ignored
+tokens of preprocess, and the result of postprocess applied to them
+(i.e. with a model which copies its input). It was generated with the
+original preprocess and postprocess (before the patterns were precompiled
+and the model input was built in one pass), with NLTK's word_tokenize
+replaced by the fast tokenizer, since the punkt models were not available.
+
+The golden file is checked with the fast tokenizer, and with the default
+NLTK tokenizer if the punkt models are installed (otherwise that test is
+skipped).
+
+After an intended change of the output, regenerate the golden file from the
+current implementation with:
+    python -m tests.test_preprocessing --update
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from normalize import Normalizer  # noqa: E402
+
+TEST_FILE = os.path.join(ROOT, 'data', 'test.fnhd')
+GOLDEN_FILE = os.path.join(ROOT, 'tests', 'golden', 'test.fnhd.jsonl')
+CONFIG_FILE = os.path.join(ROOT, 'config_normalizer.json')
+
+
+def has_punkt():
+    """
+    Check if NLTK and its punkt models are installed.
+    """
+
+    try:
+        import nltk
+        nltk.data.find('tokenizers/punkt_tab')
+    except (ImportError, LookupError):
+        return False
+    return True
+
+
+def build_normalizer(tokenizer='fast'):
+    """
+    Create a normalizer without loading any model.
+    """
+
+    with open(CONFIG_FILE) as configfile:
+        config = json.load(configfile)
+    config['tokenizer'] = tokenizer
+    with mock.patch.object(Normalizer, '_load_model', return_value=None):
+        return Normalizer(config)
+
+
+def process(normalizer, line):
+    """
+    Preprocess a line and postprocess the model input.
+
+    Returns:
+        dict: the model input, the ignored tokens and the postprocessed line.
+    """
+
+    model_input, ignore_tokens = normalizer.preprocess(line)
+    return {'input': line,
+            'model_input': model_input,
+            'ignore_tokens': [list(token) for token in ignore_tokens],
+            'output': normalizer.postprocess(model_input, ignore_tokens)}
+
+
+def read_lines():
+    """
+    Read the lines of the test file.
+    """
+
+    with open(TEST_FILE) as infile:
+        return [line.rstrip('\n') for line in infile]
+
+
+class PreprocessingGoldenTest(unittest.TestCase):
+    """
+    Compare preprocess and postprocess with the golden file.
+    """
+
+    def check_golden(self, normalizer):
+        with open(GOLDEN_FILE) as goldenfile:
+            golden = [json.loads(line) for line in goldenfile]
+        lines = read_lines()
+        self.assertEqual(len(lines), len(golden))
+        for number, (line, expected) in enumerate(zip(lines, golden), 1):
+            with self.subTest(line=number):
+                self.assertEqual(process(normalizer, line), expected)
+
+    def test_golden(self):
+        self.check_golden(build_normalizer('fast'))
+
+    @unittest.skipUnless(has_punkt(), 'NLTK punkt models are not installed')
+    def test_golden_nltk(self):
+        self.check_golden(build_normalizer('nltk'))
+
+
+def update():
+    """
+    Write the golden file from the current implementation.
+    """
+
+    normalizer = build_normalizer()
+    with open(GOLDEN_FILE, 'w') as goldenfile:
+        for line in read_lines():
+            goldenfile.write(json.dumps(process(normalizer, line),
+                                        ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    if '--update' in sys.argv:
+        update()
+    else:
+        unittest.main()
@@ -0,0 +1,635 @@
+"""
+Incremental training pipeline: the stages of train_model.sh with a
+content-addressed cache of their outputs.
+
+Each stage is keyed by a hash of its input files, the configuration keys it
+reads, the source of its scripts and its command (without --workers, which
+does not change the outputs). After a stage has run, its
+outputs are stored under that key in the cache directory and hard-linked into
+the output directory. On the next run, a stage whose key is in the cache
+is restored instead of executed, so only the stages downstream of a change
+run again: e.g. changing a replacement rule regenerates the source corpus
+but does not clean the target corpus again.
+
+Independent stages run concurrently, e.g. the encoding of the six
+partitions. The output of every stage is written to OUTDIR/logs/STAGE.log.
+At the end, the time and throughput of every stage are reported and
+written to OUTDIR/pipeline_report.json.
+
+Usage: python train_pipeline.py [-o textnorm] [-s fnhd] [-t nhd] [-w]
+           [--no-train] INPUT_FILE CONFIG_FILE
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(ROOT, 'scripts')
+
+BLOCK_SIZE = 1 << 20
+
+# Options which only set the parallelism of a command and do not change its
+# outputs, so they are not part of the cache key.
+PARALLELISM_OPTIONS = frozenset(['--workers'])
+
+TRAIN_ARGS = ['--arch', 'transformer',
+              '--share-all-embeddings',
+              '--dropout', '0.3',
+              '--weight-decay', '0.0',
+              '--criterion', 'label_smoothed_cross_entropy',
+              '--label-smoothing', '0.1',
+              '--optimizer', 'adam',
+              '--adam-betas', '(0.9, 0.98)',
+              '--clip-norm', '0.0',
+              '--lr', '0.001',
+              '--lr-scheduler', 'inverse_sqrt',
+              '--warmup-updates', '4000',
+              '--max-tokens', '4096',
+              '--update-freq', '16',
+              '--max-update', '100000',
+              '--max-epoch', '10',
+              '--skip-invalid-size-inputs-valid-test']
+
+
+class Stage():
+    """
+    A stage of the pipeline.
+
+    Args:
+        name (str): the name of the stage.
+        commands: a list of commands (lists of arguments) which are run
+            in order, or a function without arguments.
+        inputs (list): the paths of the input files or directories.
+        outputs (list): the paths of the output files or directories.
+        config_keys (list): the keys of the configuration the stage reads.
+        scripts (list): the paths of the source files of the stage.
+        cwd (str): the working directory of the commands.
+    """
+
+    def __init__(self, name, commands, inputs, outputs, config_keys=(),
+                 scripts=(), cwd=None):
+        self.name = name
+        self.commands = commands
+        self.inputs = inputs
+        self.outputs = outputs
+        self.config_keys = config_keys
+        self.scripts = scripts
+        self.cwd = cwd
+
+
+class FileHasher():
+    """
+    Content hashes of files and directories. The hash of a file is memoized
+    by its path, size and modification time in a JSON file, so unchanged
+    inputs are not read again on the next run.
+
+    Args:
+        path (str): the JSON file of the memoized hashes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path) as hashfile:
+                self.hashes = json.load(hashfile)
+
+
+    def hash(self, path):
+        """
+        Hash the content of a file, or the names and contents of the files
+        in a directory.
+
+        Args:
+            path (str): the path of the file or directory.
+
+        Returns:
+            str: the hexadecimal SHA-256 hash.
+        """
+
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    filepath = os.path.join(dirpath, filename)
+                    digest.update(os.path.relpath(filepath, path).encode())
+                    digest.update(self.hash(filepath).encode())
+            return digest.hexdigest()
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        memo = self.hashes.get(path)
+        if memo is not None and memo[0] == signature:
+            return memo[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as infile:
+            for block in iter(lambda: infile.read(BLOCK_SIZE), b''):
+                digest.update(block)
+        self.hashes[path] = [signature, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+    def save(self):
+        """
+        Write the memoized hashes to the JSON file.
+        """
+
+        with open(self.path, 'w') as hashfile:
+            json.dump(self.hashes, hashfile)
+
+
+def without_parallelism(command):
+    """
+    Remove the parallelism options and their values from a command.
+
+    Args:
+        command (list): the arguments of the command.
+
+    Returns:
+        list: the remaining arguments.
+    """
+
+    arguments = []
+    skip = False
+    for argument in command:
+        if skip:
+            skip = False
+        elif argument in PARALLELISM_OPTIONS:
+            skip = True
+        else:
+            arguments.append(argument)
+    return arguments
+
+
+def stage_key(stage, config, hasher):
+    """
+    Compute the cache key of a stage.
+
+    Args:
+        stage (Stage): the stage.
+        config (dict): the configuration.
+        hasher (FileHasher): the hashes of the files.
+
+    Returns:
+        str: the hexadecimal SHA-256 hash of the inputs, the configuration
+            keys, the scripts and the commands of the stage (without the
+            parallelism options).
+    """
+
+    if callable(stage.commands):
+        commands = f'{stage.commands.__module__}.{stage.commands.__name__}'
+    else:
+        commands = [without_parallelism(command) for command in stage.commands]
+    description = {'name': stage.name,
+                   'commands': commands,
+                   'inputs': [hasher.hash(path) for path in stage.inputs],
+                   'config': {key: config.get(key) for key in stage.config_keys},
+                   'scripts': [hasher.hash(path) for path in stage.scripts]}
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()) \
+                  .hexdigest()
+
+
+def link_file(source, target):
+    """
+    Hard-link a file, or copy it if the file system does not allow it.
+    """
+
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def link(source, target):
+    """
+    Hard-link a file or the files of a directory.
+    """
+
+    if os.path.isdir(source):
+        shutil.copytree(source, target, copy_function=link_file)
+    else:
+        link_file(source, target)
+
+
+def remove(path):
+    """
+    Remove a file or a directory if it exists.
+    """
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def input_size(stage):
+    """
+    Get the total size in bytes of the inputs of a stage.
+    """
+
+    size = 0
+    for path in stage.inputs:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                size += sum(os.path.getsize(os.path.join(dirpath, filename))
+                            for filename in filenames)
+        elif os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+
+class Pipeline():
+    """
+    Run the stages of a pipeline with a content-addressed cache.
+
+    Args:
+        stages (list): the stages, each after the stages that produce
+            its inputs.
+        config (dict): the configuration.
+        outdir (str): the output directory, with the logs and the report.
+        cache_dir (str): the cache directory.
+        jobs (int): the maximum number of stages which run concurrently.
+        force (bool): run every stage even if its outputs are in the cache.
+    """
+
+    def __init__(self, stages, config, outdir, cache_dir, jobs=4, force=False):
+        self.stages = stages
+        self.config = config
+        self.outdir = outdir
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.force = force
+        self.log_dir = os.path.join(outdir, 'logs')
+        os.makedirs(self.log_dir, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hasher = FileHasher(os.path.join(cache_dir, 'hashes.json'))
+        producers = {}
+        for stage in stages:
+            for path in stage.outputs:
+                producers[path] = stage.name
+        self.dependencies = {stage.name: set(producers[path]
+                                             for path in stage.inputs
+                                             if path in producers)
+                             for stage in stages}
+
+
+    def restore(self, stage, key):
+        """
+        Link the cached outputs of a stage into place.
+
+        Returns:
+            bool: True if the outputs were in the cache, False otherwise.
+        """
+
+        cached = os.path.join(self.cache_dir, stage.name, key)
+        if self.force or not os.path.exists(os.path.join(cached, '.complete')):
+            return False
+        for index, path in enumerate(stage.outputs):
+            remove(path)
+            link(os.path.join(cached, str(index)), path)
+        return True
+
+
+    def store(self, stage, key):
+        """
+        Link the outputs of a stage into the cache.
+        """
+
+        cached = os.path.join(self.cache_dir, stage.name, key)
+        remove(cached)
+        partial = cached + '.partial'
+        remove(partial)
+        os.makedirs(partial)
+        for index, path in enumerate(stage.outputs):
+            link(path, os.path.join(partial, str(index)))
+        open(os.path.join(partial, '.complete'), 'w').close()
+        os.rename(partial, cached)
+
+
+    def execute(self, stage):
+        """
+        Run a stage. The outputs are removed first: a command which opened
+        a hard-linked output for writing would otherwise modify the cache.
+
+        Returns:
+            float: the time the stage took in seconds.
+        """
+
+        start = time.perf_counter()
+        for path in stage.outputs:
+            remove(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if callable(stage.commands):
+            stage.commands()
+        else:
+            log_path = os.path.join(self.log_dir, f'{stage.name}.log')
+            with open(log_path, 'w') as logfile:
+                for command in stage.commands:
+                    logfile.write(f'$ {" ".join(command)}\n')
+                    logfile.flush()
+                    try:
+                        result = subprocess.run(command, cwd=stage.cwd,
+                                                stdout=logfile,
+                                                stderr=subprocess.STDOUT)
+                    except OSError as error:
+                        raise RuntimeError(f'Stage {stage.name} failed: '
+                                           f'{error}') from error
+                    if result.returncode != 0:
+                        raise RuntimeError(f'Stage {stage.name} failed with '
+                                           f'exit code {result.returncode}, '
+                                           f'see {log_path}')
+        for path in stage.outputs:
+            if not os.path.exists(path):
+                raise RuntimeError(f'Stage {stage.name} did not create {path}')
+        return time.perf_counter() - start
+
+
+    def run(self):
+        """
+        Run the stages in the order of their dependencies.
+
+        Returns:
+            list: the report of every stage.
+        """
+
+        report = {}
+        done = set()
+        started = set()
+        running = {}
+        keys = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                while len(done) < len(self.stages):
+                    for stage in self.stages:
+                        if stage.name in started \
+                                or not self.dependencies[stage.name] <= done:
+                            continue
+                        started.add(stage.name)
+                        keys[stage.name] = stage_key(stage, self.config,
+                                                     self.hasher)
+                        if self.restore(stage, keys[stage.name]):
+                            print(f'{stage.name}: cached')
+                            report[stage.name] = {'stage': stage.name,
+                                                  'status': 'cached',
+                                                  'key': keys[stage.name]}
+                            done.add(stage.name)
+                        else:
+                            print(f'{stage.name}: running ...')
+                            running[executor.submit(self.execute, stage)] = stage
+                    if not running:
+                        continue
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        stage = running.pop(future)
+                        seconds = future.result()
+                        self.store(stage, keys[stage.name])
+                        size = input_size(stage) / 2**20
+                        report[stage.name] = {'stage': stage.name,
+                                              'status': 'ran',
+                                              'key': keys[stage.name],
+                                              'seconds': round(seconds, 3),
+                                              'input_mb': round(size, 3),
+                                              'mb_per_second':
+                                                  round(size / seconds, 3)
+                                                  if seconds else None}
+                        print(f'{stage.name}: done in {seconds:.1f}s')
+                        done.add(stage.name)
+        finally:
+            self.hasher.save()
+        return [report[stage.name] for stage in self.stages]
+
+
+def print_report(report):
+    """
+    Print the status, time and throughput of every stage.
+    """
+
+    print(f'{"stage":<20} {"status":<8} {"seconds":>10} {"input MB":>10} '
+          f'{"MB/s":>10}')
+    for entry in report:
+        if entry['status'] == 'cached':
+            print(f'{entry["stage"]:<20} {"cached":<8}')
+            continue
+        throughput = entry['mb_per_second']
+        throughput = '-' if throughput is None else f'{throughput:.2f}'
+        print(f'{entry["stage"]:<20} {entry["status"]:<8} '
+              f'{entry["seconds"]:>10.1f} {entry["input_mb"]:>10.1f} '
+              f'{throughput:>10}')
+
+
+def concatenate(infile_paths, outfile_path):
+    """
+    Create a function which concatenates files.
+    """
+
+    def concatenate_files():
+        with open(outfile_path, 'wb') as outfile:
+            for path in infile_paths:
+                with open(path, 'rb') as infile:
+                    shutil.copyfileobj(infile, outfile, BLOCK_SIZE)
+
+    return concatenate_files
+
+
+def build_stages(args):
+    """
+    Define the stages of train_model.sh.
+
+    Args:
+        args: the command-line arguments.
+
+    Returns:
+        list: the stages, each after the stages that produce its inputs.
+    """
+
+    python = sys.executable
+    src, tgt = args.source, args.target
+    outdir = os.path.abspath(args.outdir)
+    config = os.path.abspath(args.config)
+    datadir = os.path.abspath(os.path.join('data-bin', args.outdir))
+    savedir = os.path.abspath(os.path.join('checkpoints', args.outdir))
+    workers = ['--workers', str(args.workers)]
+
+    def path(name):
+        return os.path.join(outdir, name)
+
+    def script(name):
+        return os.path.join(SCRIPTS, name)
+
+    # with the word-with-context model, the windows take the place of
+    # the sentence corpus, which is kept as corpus.orig.*
+    corpus = 'corpus.orig' if args.word_with_context else 'corpus'
+
+    stages = [
+        Stage('clean',
+              [[python, script('clean_target_corpus.py'), args.input,
+                path(f'{corpus}.{tgt}'), config] + workers],
+              [args.input], [path(f'{corpus}.{tgt}')],
+              ['charset_target', 'lang', 'n_to_m', 'num_copies',
+               'filter_langs', 'tokenizer', 'dedup', 'bloom_capacity',
+               'bloom_error_rate', 'near_dedup_threshold'],
+              [script('clean_target_corpus.py'), script('word_tokenizer.py'),
+               script('parallel.py')]),
+        Stage('generate',
+              [[python, script('generate_source_corpus.py'),
+                path(f'{corpus}.{tgt}'), path(f'{corpus}.{src}'), config,
+                '--seed', str(args.seed)] + workers],
+              [path(f'{corpus}.{tgt}')], [path(f'{corpus}.{src}')],
+              ['lang', 'n_to_m', 'vowels', 'consonants', 'replacements'],
+              [script('generate_source_corpus.py'), script('parallel.py')]),
+    ]
+
+    if args.word_with_context:
+        stages.append(
+            Stage('context',
+                  [[python, script('prepare_word_with_context_data.py'),
+                    path(f'{corpus}.{src}'), path(f'{corpus}.{tgt}'),
+                    path(f'corpus.{src}'), path(f'corpus.{tgt}')] + workers],
+                  [path(f'{corpus}.{src}'), path(f'{corpus}.{tgt}')],
+                  [path(f'corpus.{src}'), path(f'corpus.{tgt}')],
+                  scripts=[script('prepare_word_with_context_data.py'),
+                           script('parallel.py')]))
+
+    partitions = [f'{partition}.{lang}' for partition in ['train', 'valid', 'test']
+                  for lang in [src, tgt]]
+    stages.append(
+        Stage('split',
+              [[python, script('split_training_data.py'), path(f'corpus.{src}'),
+                path(f'corpus.{tgt}'), outdir, src, tgt,
+                '--seed', str(args.seed)]],
+              [path(f'corpus.{src}'), path(f'corpus.{tgt}')],
+              [path(name) for name in partitions],
+              scripts=[script('split_training_data.py')]))
+
+    # sentencepiece samples and shuffles the training lines itself,
+    # so the concatenation is not shuffled
+    stages.append(
+        Stage('train_full',
+              concatenate([path(f'train.{src}'), path(f'train.{tgt}')],
+                          path('train.full')),
+              [path(f'train.{src}'), path(f'train.{tgt}')],
+              [path('train.full')],
+              scripts=[os.path.abspath(__file__)]))
+
+    word_with_context = ['true'] if args.word_with_context else []
+    stages.append(
+        Stage('sentencepiece',
+              [[python, script('subword_encode.py'), src, tgt, outdir,
+                'train.full'] + word_with_context + ['--files']],
+              [path('train.full')],
+              [path('subword.model'), path('subword.vocab')],
+              scripts=[script('subword_encode.py')], cwd=outdir))
+
+    for name in partitions:
+        partition, lang = name.split('.', 1)
+        stages.append(
+            Stage(f'encode.{name}',
+                  [[python, script('subword_encode.py'), src, tgt, outdir,
+                    'train.full', '--model', path('subword.model'),
+                    '--workers', '1', '--files', name]],
+                  [path('subword.model'), path(name)],
+                  [path(f'{partition}.sub.{lang}')],
+                  scripts=[script('subword_encode.py')]))
+
+    stages.append(
+        Stage('binarize',
+              [['fairseq-preprocess', '--joined-dictionary',
+                '--source-lang', src, '--target-lang', tgt,
+                '--trainpref', path('train.sub'),
+                '--validpref', path('valid.sub'),
+                '--testpref', path('test.sub'),
+                '--destdir', datadir,
+                '--thresholdtgt', '0', '--thresholdsrc', '0',
+                '--workers', str(args.workers)],
+               ['cp', path('subword.model'), path('subword.vocab'), datadir]],
+              [path(f'{partition}.sub.{lang}')
+               for partition in ['train', 'valid', 'test']
+               for lang in [src, tgt]]
+              + [path('subword.model'), path('subword.vocab')],
+              [datadir]))
+
+    if not args.no_train:
+        stages.append(
+            Stage('train',
+                  [['fairseq-train', datadir, '--source-lang', src,
+                    '--target-lang', tgt, '--save-dir', savedir]
+                   + TRAIN_ARGS],
+                  [datadir], [savedir]))
+
+    return stages
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Prepare the training data '
+                                     'and train a normalization model, '
+                                     'reusing the cached outputs of unchanged '
+                                     'stages.')
+    parser.add_argument('input', help='The raw target corpus.')
+    parser.add_argument('config', help='JSON configuration file.')
+    parser.add_argument('-o', '--outdir', default='textnorm',
+                        help='Output directory (default: textnorm).')
+    parser.add_argument('-s', '--source', default='fnhd',
+                        help='Suffix of the source side (default: fnhd).')
+    parser.add_argument('-t', '--target', default='nhd',
+                        help='Suffix of the target side (default: nhd).')
+    parser.add_argument('-w', '--word-with-context', action='store_true',
+                        help='Prepare the data of a word-with-context model.')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Run every stage, even if its outputs are cached.')
+    parser.add_argument('--no-train', action='store_true',
+                        help='Stop after binarizing the training data.')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed of the source corpus generation and of the '
+                        'split (default: 1).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes per stage '
+                        '(default: number of CPUs).')
+    parser.add_argument('--jobs', '-j', type=int, default=6,
+                        help='Number of stages which run concurrently '
+                        '(default: 6).')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Cache directory (default: OUTDIR/.cache).')
+    return parser.parse_args()
+
+
+def main():
+    """
+    Build the stages, run them and report their times and throughputs.
+    """
+
+    args = parse_args()
+    args.input = os.path.abspath(args.input)
+    with open(args.config) as configfile:
+        config = json.load(configfile)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    cache_dir = args.cache_dir or os.path.join(args.outdir, '.cache')
+    pipeline = Pipeline(build_stages(args), config, args.outdir, cache_dir,
+                        args.jobs, args.force)
+    try:
+        report = pipeline.run()
+    except RuntimeError as error:
+        print(error)
+        sys.exit(1)
+
+    print_report(report)
+    with open(os.path.join(args.outdir, 'pipeline_report.json'), 'w') \
+            as reportfile:
+        json.dump(report, reportfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Two-level cache for model translations.
+
+The first level is an in-process LRU cache, the second level an optional
+sqlite database on disk, which is shared between runs and processes.
+Keys are the model input strings, namespaced by a fingerprint of the model
+(checkpoint, sentencepiece model and generation arguments), so that cached
+translations of an old model are never returned for a new one.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+
+
+def file_fingerprint(paths, extra=None):
+    """
+    Compute a fingerprint of the content of some files.
+
+    Args:
+        paths (list): the files, e.g. a checkpoint and a sentencepiece model.
+        extra: further JSON-serializable data to include, e.g. generation
+            arguments.
+
+    Returns:
+        str: a hexadecimal SHA-256 digest.
+    """
+
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as infile:
+            for block in iter(lambda: infile.read(1 << 20), b''):
+                digest.update(block)
+    digest.update(json.dumps(extra, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class LRUCache():
+    """
+    In-memory cache which discards the least recently used entries.
+
+    Args:
+        maxsize (int): maximum number of entries.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Look up a key and mark it as recently used.
+
+        Returns:
+            str: the cached value, or None if the key is not cached.
+        """
+
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value, discarding the least recently used entry if necessary.
+        """
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class DiskCache():
+    """
+    Persistent key-value store in a sqlite database.
+
+    Args:
+        path (str): the database file, created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS translations '
+                                '(key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.connection.commit()
+
+    def get_many(self, keys):
+        """
+        Look up several keys.
+
+        Returns:
+            dict: the cached values of the keys found in the database.
+        """
+
+        found = {}
+        keys = list(keys)
+        # stay below sqlite's limit of host parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start+500]
+            placeholders = ','.join('?' * len(chunk))
+            found.update(self.connection.execute(
+                'SELECT key, value FROM translations '
+                f'WHERE key IN ({placeholders})', chunk))
+        return found
+
+    def put_many(self, items):
+        """
+        Store several key-value pairs in a single transaction.
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO translations VALUES (?, ?)', items)
+
+
+class TranslationCache():
+    """
+    Cache for the translations of one model.
+
+    Args:
+        fingerprint (str): fingerprint of the model, see file_fingerprint.
+        size (int): maximum number of entries in the in-memory cache.
+        path (str): optional sqlite database for the on-disk cache.
+
+    Attributes:
+        stats (dict): number of memory hits, disk hits and misses.
+    """
+
+    def __init__(self, fingerprint, size, path=None):
+        self.fingerprint = fingerprint
+        self.memory = LRUCache(size)
+        self.disk = DiskCache(path) if path else None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def lookup(self, sentences):
+        """
+        Look up the translations of some strings.
+
+        Args:
+            sentences (list): the model inputs.
+
+        Returns:
+            dict: the cached translations of the strings found in the cache.
+            The hits and misses are counted per occurrence of a string.
+        """
+
+        found = {}
+        for sentence in sentences:
+            if sentence in found:
+                self.stats['memory_hits'] += 1
+                continue
+            value = self.memory.get(sentence)
+            if value is not None:
+                found[sentence] = value
+                self.stats['memory_hits'] += 1
+        missing = [sentence for sentence in sentences if sentence not in found]
+        if self.disk is not None and missing:
+            stored = self.disk.get_many(f'{self.fingerprint}:{sentence}'
+                                        for sentence in set(missing))
+            for sentence in missing:
+                value = stored.get(f'{self.fingerprint}:{sentence}')
+                if value is not None:
+                    found[sentence] = value
+                    self.memory.put(sentence, value)
+                    self.stats['disk_hits'] += 1
+                else:
+                    self.stats['misses'] += 1
+        else:
+            self.stats['misses'] += len(missing)
+        return found
+
+    def store(self, translations):
+        """
+        Store new translations in both cache levels.
+
+        Args:
+            translations (dict): the translations of some model inputs.
+        """
+
+        for sentence, value in translations.items():
+            self.memory.put(sentence, value)
+        if self.disk is not None and translations:
+            self.disk.put_many((f'{self.fingerprint}:{sentence}', value)
+                               for sentence, value in translations.items())